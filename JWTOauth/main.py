@@ -1,5 +1,7 @@
 import json
 import secrets
+import sys
+import time
 from datetime import datetime
 
 import os
@@ -7,6 +9,9 @@ from cozepy import load_oauth_app_from_config, JWTOAuthApp
 from flask import Flask, redirect, session, request
 from flask_cors import CORS
 
+from template_renderer import TemplateRenderer
+from token_cache import TokenCache
+
 app = Flask(
     __name__,
     static_folder="assets",  # use shared/assets as static directory
@@ -15,10 +20,13 @@ app = Flask(
 app.secret_key = secrets.token_hex(16)  # for Flask session encryption
 
 # 启用CORS支持，允许来自coze.cn域的跨域请求
-CORS(app, origins=["https://www.coze.cn", "https://coze.cn"], supports_credentials=True)
+CORS_ORIGINS = ["https://www.coze.cn", "https://coze.cn"]
+CORS(app, origins=CORS_ORIGINS, supports_credentials=True)
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
-COZE_OAUTH_CONFIG_PATH = "coze_oauth_config.json"
+# 可以用 COZE_OAUTH_CONFIG 环境变量指定其他配置文件（例如基准测试时指向本地桩服务）
+COZE_OAUTH_CONFIG_PATH = os.getenv("COZE_OAUTH_CONFIG", "coze_oauth_config.json")
+STARTED_AT = time.time()
 REDIRECT_URI = "http://127.0.0.1:8081/callback"
 
 
@@ -48,20 +56,56 @@ def timestamp_to_datetime(timestamp: int) -> str:
 app_config = load_app_config(COZE_OAUTH_CONFIG_PATH)
 coze_oauth_app = load_coze_oauth_app(COZE_OAUTH_CONFIG_PATH)
 
+# token 有效期（秒）以及有效期过去多少比例后在后台提前刷新
+TOKEN_TTL = app_config.get("token_ttl", 900)
+TOKEN_REFRESH_RATIO = app_config.get("token_refresh_ratio", 0.8)
+# 最多缓存的会话数（session_name 由客户端传入）
+TOKEN_CACHE_SIZE = app_config.get("token_cache_size", 1024)
+
+token_cache = TokenCache(
+    lambda session_name: coze_oauth_app.get_access_token(
+        ttl=TOKEN_TTL, session_name=session_name
+    ),
+    refresh_ratio=TOKEN_REFRESH_RATIO,
+    max_sessions=TOKEN_CACHE_SIZE,
+)
 
-def read_html_template(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
+# 模板在启动时编译进内存；设置 TEMPLATE_AUTO_RELOAD=1 时按修改时间自动重新加载
+TEMPLATE_FILES = ["websites/index.html", "websites/callback.html", "websites/error.html"]
+template_renderer = TemplateRenderer(auto_reload=os.getenv("TEMPLATE_AUTO_RELOAD") == "1")
+template_renderer.preload(TEMPLATE_FILES)
 
 
 def render_template(template: str, kwargs: dict) -> str:
-    if not kwargs:
-        kwargs = {}
-    kwargs["coze_www_base"] = app_config["coze_www_base"]
-    template = read_html_template(template)
-    for key, value in kwargs.items():
-        template = template.replace(f"{{{{{key}}}}}", str(value))
-    return template
+    context = dict(kwargs or {})
+    context["coze_www_base"] = app_config["coze_www_base"]
+    return template_renderer.render(template, context)
+
+
+def token_response_data(oauth_token) -> dict:
+    expires_str = timestamp_to_datetime(oauth_token.expires_in)
+    return {
+        "token_type": oauth_token.token_type,
+        "access_token": oauth_token.access_token,
+        "refresh_token": "",
+        "expires_in": f"{oauth_token.expires_in} ({expires_str})",
+    }
+
+
+def health_data() -> dict:
+    """存活检查：进程在运行即可"""
+    return {"status": "ok", "uptime": round(time.time() - STARTED_AT, 1)}
+
+
+def readiness_data():
+    """就绪检查：只读取内存中的状态，不访问 Coze 也不读磁盘；返回 (数据, 是否就绪)"""
+    ready = coze_oauth_app is not None
+    data = {
+        "status": "ready" if ready else "not_ready",
+        "config_loaded": ready,
+        "token_cache": token_cache.stats(),
+    }
+    return data, ready
 
 
 @app.errorhandler(Exception)
@@ -88,6 +132,17 @@ def index():
     return render_template("websites/index.html", app_config)
 
 
+@app.route("/__health")
+def health():
+    return health_data(), 200, {"Cache-Control": "no-store"}
+
+
+@app.route("/__ready")
+def ready():
+    data, is_ready = readiness_data()
+    return data, 200 if is_ready else 503, {"Cache-Control": "no-store"}
+
+
 @app.route("/login")
 def login():
     return redirect("/callback")
@@ -107,12 +162,14 @@ def callback():
         # 获取会话名称参数（从查询参数或请求头）
         session_name = request.args.get('session_name') or request.headers.get('X-Session-Name')
         
-        if session_name:
-            print(f"🔑 为会话 {session_name} 生成JWT token")
-        else:
-            print("⚠️  未提供会话名称，使用默认token")
-
-        oauth_token = coze_oauth_app.get_access_token(session_name=session_name)
+        # 缓存命中时直接返回，只有真正生成 token 时才输出日志
+        oauth_token = token_cache.get_cached(session_name)
+        if oauth_token is None:
+            if session_name:
+                print(f"🔑 为会话 {session_name} 生成JWT token")
+            else:
+                print("⚠️  未提供会话名称，使用默认token")
+            oauth_token = token_cache.get(session_name)
         
         # 将 OAuth token 保存到 session 中，以便后续使用
         session_key = f'oauth_token_{app_config["client_id"]}'
@@ -126,17 +183,10 @@ def callback():
             "session_name": session_name  # 保存会话名称信息
         }
 
-        expires_str = timestamp_to_datetime(oauth_token.expires_in)
+        response_data = token_response_data(oauth_token)
 
         # 如果是 AJAX 请求，返回 JSON 格式
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            response_data = {
-                "token_type": oauth_token.token_type,
-                "access_token": oauth_token.access_token,
-                "refresh_token": "",
-                "expires_in": f"{oauth_token.expires_in} ({expires_str})",
-            }
-            
             # 添加会话名称信息到响应
             if session_name:
                 response_data['session_name'] = session_name
@@ -144,16 +194,8 @@ def callback():
             return response_data
 
         # 否则返回 HTML 页面
-        return render_template(
-            "websites/callback.html",
-            {
-                "token_type": oauth_token.token_type,
-                "access_token": oauth_token.access_token,
-                "refresh_token": "",
-                "expires_in": f"{oauth_token.expires_in} ({expires_str})",
-                "session_name": session_name or "未提供"
-            },
-        )
+        response_data["session_name"] = session_name or "未提供"
+        return render_template("websites/callback.html", response_data)
     except Exception as e:
         error_message = f"Failed to get access token: {str(e)}"
         print(f"JWT Authentication Error: {error_message}")
@@ -169,5 +211,161 @@ def callback():
         return render_template("websites/error.html", {"error": error_message})
 
 
+def create_async_app(workers: int = 8):
+    """
+    创建 aiohttp 版本的 token 服务（生产模式）。
+    与 Flask 版本共用 token_cache 和模板；缓存命中时直接在事件循环中返回，
+    未命中时 get_access_token 在大小为 workers 的线程池中执行，多个请求可同时进行。
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from aiohttp import web
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jwt-token")
+    not_configured = "OAuth application is not properly configured. Please check your configuration file."
+
+    def is_ajax(request: web.Request) -> bool:
+        return request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
+    def html(text: str) -> web.Response:
+        return web.Response(text=text, content_type="text/html")
+
+    def add_cors_headers(headers, origin):
+        if origin in CORS_ORIGINS:
+            headers["Access-Control-Allow-Origin"] = origin
+            headers["Access-Control-Allow-Credentials"] = "true"
+            headers["Vary"] = "Origin"
+
+    @web.middleware
+    async def cors_and_errors(request: web.Request, handler):
+        origin = request.headers.get("Origin")
+        if request.method == "OPTIONS":
+            response = web.Response()
+            if origin in CORS_ORIGINS:
+                response.headers["Access-Control-Allow-Methods"] = request.headers.get(
+                    "Access-Control-Request-Method", "GET"
+                )
+                response.headers["Access-Control-Allow-Headers"] = request.headers.get(
+                    "Access-Control-Request-Headers", ""
+                )
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as error:
+                # 重定向和 4xx/5xx 同样需要 CORS 头，否则浏览器读不到状态码
+                add_cors_headers(error.headers, origin)
+                raise
+            except Exception as error:
+                error_message = str(error)
+                print(f"Error occurred: {error_message}")
+                if is_ajax(request):
+                    response = web.json_response({"error": error_message}, status=500)
+                else:
+                    response = html(render_template("websites/error.html", {"error": error_message}))
+        add_cors_headers(response.headers, origin)
+        return response
+
+    async def index(request: web.Request) -> web.Response:
+        if not coze_oauth_app:
+            return html(render_template("websites/error.html", {"error": not_configured}))
+        return html(render_template("websites/index.html", app_config))
+
+    async def login(request: web.Request) -> web.Response:
+        raise web.HTTPFound("/callback")
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response(health_data(), headers={"Cache-Control": "no-store"})
+
+    async def ready(request: web.Request) -> web.Response:
+        data, is_ready = readiness_data()
+        return web.json_response(
+            data, status=200 if is_ready else 503, headers={"Cache-Control": "no-store"}
+        )
+
+    async def callback(request: web.Request) -> web.Response:
+        if not coze_oauth_app:
+            return html(render_template("websites/error.html", {"error": not_configured}))
+
+        session_name = request.query.get("session_name") or request.headers.get("X-Session-Name")
+        try:
+            oauth_token = token_cache.get_cached(session_name)
+            if oauth_token is None:
+                if session_name:
+                    print(f"🔑 为会话 {session_name} 生成JWT token")
+                else:
+                    print("⚠️  未提供会话名称，使用默认token")
+                loop = asyncio.get_running_loop()
+                oauth_token = await loop.run_in_executor(executor, token_cache.get, session_name)
+        except Exception as e:
+            error_message = f"Failed to get access token: {str(e)}"
+            print(f"JWT Authentication Error: {error_message}")
+            if is_ajax(request):
+                return web.json_response(
+                    {
+                        "error": error_message,
+                        "error_type": "jwt_authentication_failed",
+                        "details": str(e),
+                    },
+                    status=500,
+                )
+            return html(render_template("websites/error.html", {"error": error_message}))
+
+        response_data = token_response_data(oauth_token)
+        if is_ajax(request):
+            if session_name:
+                response_data["session_name"] = session_name
+            return web.json_response(response_data)
+        response_data["session_name"] = session_name or "未提供"
+        return html(render_template("websites/callback.html", response_data))
+
+    async def shutdown_executor(app: web.Application):
+        executor.shutdown(wait=False)
+
+    async_app = web.Application(middlewares=[cors_and_errors])
+    async_app.router.add_get("/", index)
+    async_app.router.add_get("/login", login)
+    async_app.router.add_get("/__health", health)
+    async_app.router.add_get("/__ready", ready)
+    async_app.router.add_get("/callback", callback)
+    if os.path.isdir("assets"):
+        async_app.router.add_static("/assets", "assets")
+    async_app.on_cleanup.append(shutdown_executor)
+    return async_app
+
+
 if __name__ == "__main__":
-    app.run(debug=False, use_reloader=False, port=8081)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="JWT OAuth token server")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8081, help="监听端口")
+    parser.add_argument(
+        "--async", dest="async_mode", action="store_true",
+        help="使用 aiohttp 异步服务（生产模式），替代 Flask 开发服务器",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 4,
+        help="异步模式下同时向 Coze 获取 token 的线程数",
+    )
+    parser.add_argument(
+        "--standby", action="store_true",
+        help="热备模式：完成加载后等待 stdin 输入一行再开始监听端口",
+    )
+    args = parser.parse_args()
+
+    if args.standby:
+        # stdin 关闭说明 supervisor 已退出，不再启动
+        try:
+            if not sys.stdin.readline():
+                sys.exit(0)
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+    if args.async_mode:
+        from aiohttp import web
+
+        print(f"🚀 以异步模式启动 JWT OAuth 服务器: http://{args.host}:{args.port} (workers={args.workers})")
+        web.run_app(create_async_app(args.workers), host=args.host, port=args.port, access_log=None)
+    else:
+        app.run(debug=False, use_reloader=False, host=args.host, port=args.port)
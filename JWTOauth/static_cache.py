@@ -0,0 +1,139 @@
+"""
+预压缩的静态文件缓存
+
+启动时把演示页面和 assets 目录读入内存，并预先生成 gzip / brotli 版本，
+请求时根据 Accept-Encoding 选择合适的版本，带强 ETag、Cache-Control 并处理 304。
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from flask import Response
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # brotli 是可选依赖，没有安装时只提供 gzip
+    brotli = None
+
+# 只对这些类型做压缩，图片等本身已压缩的格式原样返回
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# 按优先级排列的编码及其 ETag 后缀
+ENCODINGS = (("br", "-br"), ("gzip", "-gz"))
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def _opaque_tag(tag: str) -> str:
+    """If-None-Match 使用弱比较（RFC 7232 2.3.2），忽略两边的 W/ 前缀"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+class _StaticFile:
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = digest
+        # 编码 -> 响应体，identity 对应原始内容
+        self.bodies: Dict[str, bytes] = {"identity": body}
+
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.bodies["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.bodies["br"] = compressed
+
+    def etag_for(self, encoding: str) -> str:
+        suffix = dict(ENCODINGS).get(encoding, "")
+        return f'"{self.etag}{suffix}"'
+
+
+class StaticFileCache:
+    def __init__(self):
+        self._files: Dict[str, _StaticFile] = {}
+
+    def add(self, name: str, path: str, cache_control: str) -> bool:
+        """读入单个文件，文件不存在时返回 False"""
+        try:
+            with open(path, "rb") as file:
+                body = file.read()
+        except OSError:
+            return False
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        self._files[name] = _StaticFile(body, content_type, cache_control)
+        return True
+
+    def add_directory(self, prefix: str, directory: str, cache_control: str):
+        """读入目录下的所有文件，以 prefix/相对路径 作为名称"""
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                relative = os.path.relpath(path, directory).replace(os.sep, "/")
+                self.add(f"{prefix}/{relative}", path, cache_control)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._files
+
+    def serve(self, name: str, request) -> Response:
+        static_file = self._files[name]
+
+        accepted = parse_accept_encoding(request.headers.get("Accept-Encoding"))
+        encoding = "identity"
+        for candidate, _ in ENCODINGS:
+            if candidate in static_file.bodies and accepted.get(candidate, 0) > 0:
+                encoding = candidate
+                break
+
+        etag = static_file.etag_for(encoding)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": static_file.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            # 经过代理解码后浏览器拿到的是 W/ 开头的弱 ETag，同样视为匹配
+            tags = {_opaque_tag(tag) for tag in if_none_match.split(",")}
+            if "*" in tags or _opaque_tag(etag) in tags:
+                return Response(status=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            static_file.bodies[encoding],
+            status=200,
+            headers=headers,
+            content_type=static_file.content_type,
+        )
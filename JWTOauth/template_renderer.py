@@ -0,0 +1,69 @@
+"""
+HTML 模板渲染
+
+模板在启动时读入内存并按 {{key}} 占位符切分成片段列表，
+渲染时一次遍历拼接结果，不再读磁盘，也不再对整个模板反复 replace。
+"""
+
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+# (字面文本, 其后的占位符名)；最后一个片段的占位符名为 None
+Segments = List[Tuple[str, Optional[str]]]
+
+
+def compile_template(text: str) -> Segments:
+    segments: Segments = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        segments.append((text[position:match.start()], match.group(1)))
+        position = match.end()
+    segments.append((text[position:], None))
+    return segments
+
+
+class TemplateRenderer:
+    def __init__(self, auto_reload: bool = False):
+        """
+        :param auto_reload: 开发模式下根据文件修改时间自动重新编译模板
+        """
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Tuple[float, Segments]] = {}
+
+    def preload(self, paths: Iterable[str]):
+        for path in paths:
+            self._load(path)
+
+    def _load(self, path: str) -> Segments:
+        mtime = os.stat(path).st_mtime
+        with open(path, "r", encoding="utf-8") as file:
+            segments = compile_template(file.read())
+        with self._lock:
+            self._templates[path] = (mtime, segments)
+        return segments
+
+    def _get(self, path: str) -> Segments:
+        cached = self._templates.get(path)
+        if cached is None:
+            return self._load(path)
+        if self.auto_reload and os.stat(path).st_mtime != cached[0]:
+            return self._load(path)
+        return cached[1]
+
+    def render(self, path: str, context: dict) -> str:
+        parts = []
+        for literal, key in self._get(path):
+            parts.append(literal)
+            if key is None:
+                continue
+            if key in context:
+                parts.append(str(context[key]))
+            else:
+                # 未提供的占位符保持原样
+                parts.append(f"{{{{{key}}}}}")
+        return "".join(parts)
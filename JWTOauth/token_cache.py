@@ -0,0 +1,172 @@
+"""
+JWT access token 缓存
+
+按 session_name 缓存 get_access_token 的结果：
+- 未过期的 token 直接从内存返回
+- 超过 refresh_ratio * 有效期后在后台线程提前刷新，请求不必等待
+- 同一会话同时未命中时只向 Coze 发起一次请求，其余请求等待结果
+- session_name 由客户端传入，缓存最多保存 max_sessions 个会话，写入时先清理已过期的 token，
+  仍然超出时淘汰最久未使用的会话
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from cozepy import OAuthToken
+
+
+class _CachedToken:
+    def __init__(self, token: OAuthToken, issued_at: float, refresh_ratio: float):
+        self.token = token
+        self.expires_at = float(token.expires_in)
+        self.refresh_at = issued_at + (self.expires_at - issued_at) * refresh_ratio
+        self.refreshing = False
+
+
+class _Call:
+    """一次正在进行的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """合并相同 key 的并发调用：同一时刻只执行一次，其余调用方共享结果或异常"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # 已有相同 key 的调用在进行，等待它的结果
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class TokenCache:
+    def __init__(
+        self,
+        fetch_token: Callable[[Optional[str]], OAuthToken],
+        refresh_ratio: float = 0.8,
+        min_remaining: float = 30,
+        max_sessions: int = 1024,
+    ):
+        """
+        :param fetch_token: 实际获取 token 的函数，参数为 session_name
+        :param refresh_ratio: 有效期过去多少比例后开始后台刷新
+        :param min_remaining: 剩余有效期少于该秒数的 token 视为已过期
+        :param max_sessions: 最多缓存的会话数，超出时淘汰最久未使用的会话
+        """
+        self._fetch_token = fetch_token
+        self.refresh_ratio = refresh_ratio
+        self.min_remaining = min_remaining
+        self.max_sessions = max(1, max_sessions)
+        self._lock = threading.Lock()
+        # session_name -> token，按最近使用排序
+        self._tokens: 'OrderedDict[Optional[str], _CachedToken]' = OrderedDict()
+        self._inflight = SingleFlight()
+
+    def get(self, session_name: Optional[str] = None) -> OAuthToken:
+        """获取会话的 access token，优先使用缓存"""
+        token = self.get_cached(session_name)
+        if token is not None:
+            return token
+        return self._fetch(session_name)
+
+    def get_cached(self, session_name: Optional[str] = None) -> Optional[OAuthToken]:
+        """只查缓存、不阻塞：返回仍然有效的 token，没有时返回 None"""
+        now = time.time()
+        with self._lock:
+            cached = self._tokens.get(session_name)
+            if cached is None or now >= cached.expires_at - self.min_remaining:
+                return None
+            self._tokens.move_to_end(session_name)
+            if now >= cached.refresh_at and not cached.refreshing:
+                cached.refreshing = True
+                threading.Thread(
+                    target=self._refresh, args=(session_name,), daemon=True
+                ).start()
+            return cached.token
+
+    def stats(self) -> dict:
+        """缓存状态：缓存的会话数、其中仍然有效的 token 数，以及合并的并发请求数"""
+        now = time.time()
+        with self._lock:
+            sessions = len(self._tokens)
+            valid = sum(
+                1 for cached in self._tokens.values()
+                if now < cached.expires_at - self.min_remaining
+            )
+        return {
+            "sessions": sessions,
+            "valid": valid,
+            "warm": valid > 0,
+            "coalesced": self._inflight.coalesced,
+        }
+
+    def invalidate(self, session_name: Optional[str] = None):
+        with self._lock:
+            self._tokens.pop(session_name, None)
+
+    def _refresh(self, session_name: Optional[str]):
+        try:
+            self._fetch(session_name)
+        except Exception as e:
+            print(f"⚠️  后台刷新会话 {session_name} 的token失败: {e}")
+            with self._lock:
+                cached = self._tokens.get(session_name)
+                if cached is not None:
+                    cached.refreshing = False
+
+    def _fetch(self, session_name: Optional[str]) -> OAuthToken:
+        return self._inflight.do(session_name, lambda: self._fetch_and_store(session_name))
+
+    def _fetch_and_store(self, session_name: Optional[str]) -> OAuthToken:
+        issued_at = time.time()
+        token = self._fetch_token(session_name)
+        with self._lock:
+            self._tokens[session_name] = _CachedToken(token, issued_at, self.refresh_ratio)
+            self._tokens.move_to_end(session_name)
+            self._evict(issued_at)
+        return token
+
+    def _evict(self, now: float):
+        """调用方持有 _lock：清理已过期的 token，仍然超出上限时淘汰最久未使用的会话"""
+        if len(self._tokens) <= self.max_sessions:
+            return
+        expired = [
+            name for name, cached in self._tokens.items()
+            if now >= cached.expires_at - self.min_remaining
+        ]
+        for name in expired:
+            del self._tokens[name]
+        while len(self._tokens) > self.max_sessions:
+            self._tokens.popitem(last=False)
@@ -1,17 +1,21 @@
 import json
 import secrets
+import time
 from datetime import datetime
 
 import os
 from cozepy import load_oauth_app_from_config, JWTOAuthApp
-from flask import Flask, redirect, session, request
+from flask import Flask, abort, redirect, session, request
 from flask_cors import CORS
 
+from static_cache import StaticFileCache
+from template_renderer import TemplateRenderer
+from token_cache import TokenCache
+
 app = Flask(
     __name__,
-    static_folder="assets",  # use shared/assets as static directory
-    static_url_path="/assets",
-)  # URL path for static files
+    static_folder=None,  # /assets is served from the pre-compressed StaticFileCache below
+)
 app.secret_key = secrets.token_hex(16)  # for Flask session encryption
 
 # 启用CORS支持，允许来自coze.cn域的跨域请求
@@ -19,6 +23,7 @@ CORS(app, origins=["https://www.coze.cn", "https://coze.cn"], supports_credentia
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 COZE_OAUTH_CONFIG_PATH = "coze_oauth_config.json"
+STARTED_AT = time.time()
 REDIRECT_URI = "http://127.0.0.1:8081/callback"
 
 
@@ -62,20 +67,39 @@ def timestamp_to_datetime(timestamp: int) -> str:
 app_config = load_app_config(COZE_OAUTH_CONFIG_PATH)
 coze_oauth_app = load_coze_oauth_app(COZE_OAUTH_CONFIG_PATH)
 
+# token 有效期（秒）以及有效期过去多少比例后在后台提前刷新
+TOKEN_TTL = app_config.get("token_ttl", 900)
+TOKEN_REFRESH_RATIO = app_config.get("token_refresh_ratio", 0.8)
+# 最多缓存的会话数（session_name 由客户端传入）
+TOKEN_CACHE_SIZE = app_config.get("token_cache_size", 1024)
+
+# 同一会话的并发请求只向 Coze 发起一次 token 请求
+token_cache = TokenCache(
+    lambda session_name: coze_oauth_app.get_access_token(
+        ttl=TOKEN_TTL, session_name=session_name
+    ),
+    refresh_ratio=TOKEN_REFRESH_RATIO,
+    max_sessions=TOKEN_CACHE_SIZE,
+)
+
+# 模板在启动时编译进内存；设置 TEMPLATE_AUTO_RELOAD=1 时按修改时间自动重新加载
+TEMPLATE_FILES = ["websites/index.html", "websites/callback.html", "websites/error.html"]
+template_renderer = TemplateRenderer(auto_reload=os.getenv("TEMPLATE_AUTO_RELOAD") == "1")
+template_renderer.preload(TEMPLATE_FILES)
 
-def read_html_template(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
+# 演示页面和静态资源在启动时读入内存并预压缩
+DEMO_PAGE = "demo"
+static_files = StaticFileCache()
+demo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "simple_coze_demo.html")
+if not static_files.add(DEMO_PAGE, demo_path, "no-cache"):
+    print(f"演示页面未找到: {demo_path}")
+static_files.add_directory("assets", "assets", "public, max-age=86400")
 
 
 def render_template(template: str, kwargs: dict) -> str:
-    if not kwargs:
-        kwargs = {}
-    kwargs["coze_www_base"] = app_config["coze_www_base"]
-    template = read_html_template(template)
-    for key, value in kwargs.items():
-        template = template.replace(f"{{{{{key}}}}}", str(value))
-    return template
+    context = dict(kwargs or {})
+    context["coze_www_base"] = app_config["coze_www_base"]
+    return template_renderer.render(template, context)
 
 
 @app.errorhandler(Exception)
@@ -100,19 +124,38 @@ def index():
             },
         )
     
-    # 返回简单的Coze演示页面
-    try:
-        # 使用绝对路径确保能找到文件
-        demo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "simple_coze_demo.html")
-        with open(demo_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except FileNotFoundError:
-        print(f"演示页面未找到: {demo_path}")
-        # 如果演示页面不存在，返回原来的页面
-        return render_template("websites/index.html", app_config)
-    except Exception as e:
-        print(f"读取演示页面时出错: {e}")
-        return render_template("websites/index.html", app_config)
+    # 返回简单的Coze演示页面（启动时已缓存）
+    if DEMO_PAGE in static_files:
+        return static_files.serve(DEMO_PAGE, request)
+    # 如果演示页面不存在，返回原来的页面
+    return render_template("websites/index.html", app_config)
+
+
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    name = f"assets/{filename}"
+    if name not in static_files:
+        abort(404)
+    return static_files.serve(name, request)
+
+
+@app.route("/__health")
+def health():
+    """存活检查：进程在运行即可"""
+    return {"status": "ok", "uptime": round(time.time() - STARTED_AT, 1)}, 200, {"Cache-Control": "no-store"}
+
+
+@app.route("/__ready")
+def ready():
+    """就绪检查：只读取内存中的状态，不访问 Coze 也不读磁盘"""
+    is_ready = coze_oauth_app is not None
+    data = {
+        "status": "ready" if is_ready else "not_ready",
+        "config_loaded": is_ready,
+        "demo_page_cached": DEMO_PAGE in static_files,
+        "token_cache": token_cache.stats(),
+    }
+    return data, 200 if is_ready else 503, {"Cache-Control": "no-store"}
 
 
 @app.route("/login")
@@ -134,20 +177,23 @@ def callback():
         # 获取会话名称参数（从查询参数或请求头）
         session_name = request.args.get('session_name') or request.headers.get('X-Session-Name')
         
-        if session_name:
-            print(f"🔑 为会话 {session_name} 生成JWT token")
-        else:
-            print("⚠️  未提供会话名称，使用默认token")
-
-        # 添加详细的调试信息
-        print(f"📋 应用配置: client_id={app_config.get('client_id')}")
-        print(f"🔑 私钥长度: {len(app_config.get('private_key', ''))}")
-        print(f"🌐 API基础地址: {app_config.get('coze_api_base')}")
-        
-        print(f"🔍 开始调用 get_access_token()...")
-        oauth_token = coze_oauth_app.get_access_token(session_name=session_name)
-        print(f"✅ JWT Token获取成功")
-        print(f"📊 Token信息: type={oauth_token.token_type}, expires_in={oauth_token.expires_in}")
+        # 缓存命中时直接返回，只有真正生成 token 时才输出日志
+        oauth_token = token_cache.get_cached(session_name)
+        if oauth_token is None:
+            if session_name:
+                print(f"🔑 为会话 {session_name} 生成JWT token")
+            else:
+                print("⚠️  未提供会话名称，使用默认token")
+
+            # 添加详细的调试信息
+            print(f"📋 应用配置: client_id={app_config.get('client_id')}")
+            print(f"🔑 私钥长度: {len(app_config.get('private_key', ''))}")
+            print(f"🌐 API基础地址: {app_config.get('coze_api_base')}")
+
+            print(f"🔍 开始调用 get_access_token()...")
+            oauth_token = token_cache.get(session_name)
+            print(f"✅ JWT Token获取成功")
+            print(f"📊 Token信息: type={oauth_token.token_type}, expires_in={oauth_token.expires_in}")
         
         # 将 OAuth token 保存到 session 中，以便后续使用
         session_key = f'oauth_token_{app_config["client_id"]}'
@@ -1,10 +1,13 @@
 import json
+import os
 import secrets
 from datetime import datetime
 
 from cozepy import load_oauth_app_from_config, WebOAuthApp, Coze, TokenAuth
 from flask import Flask, redirect, request, session
 
+from template_renderer import TemplateRenderer
+
 app = Flask(
     __name__,
     static_folder="assets",  # use shared/assets as static directory
@@ -39,25 +42,21 @@ def timestamp_to_datetime(timestamp: int) -> str:
     return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
 
 
-def read_html_template(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8") as file:
-        return file.read()
-
-
 def render_template(template: str, kwargs: dict) -> str:
-    if not kwargs:
-        kwargs = {}
-    kwargs["coze_www_base"] = app_config["coze_www_base"]
-    kwargs["coze_api_base"] = app_config["coze_api_base"]
-    template = read_html_template(template)
-    for key, value in kwargs.items():
-        template = template.replace(f"{{{{{key}}}}}", str(value))
-    return template
+    context = dict(kwargs or {})
+    context["coze_www_base"] = app_config["coze_www_base"]
+    context["coze_api_base"] = app_config["coze_api_base"]
+    return template_renderer.render(template, context)
 
 
 app_config = load_app_config(COZE_OAUTH_CONFIG_PATH)
 coze_oauth_app = load_coze_oauth_app(COZE_OAUTH_CONFIG_PATH)
 
+# 模板在启动时编译进内存；设置 TEMPLATE_AUTO_RELOAD=1 时按修改时间自动重新加载
+TEMPLATE_FILES = ["websites/index.html", "websites/callback.html", "websites/error.html"]
+template_renderer = TemplateRenderer(auto_reload=os.getenv("TEMPLATE_AUTO_RELOAD") == "1")
+template_renderer.preload(TEMPLATE_FILES)
+
 
 @app.errorhandler(Exception)
 def handle_error(error):
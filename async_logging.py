@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+CORS 代理服务器的异步日志
+事件循环线程只把日志记录放进有界队列（队列满时丢弃并计数，绝不阻塞），
+由后台线程批量格式化、写入文件或终端，并按文件大小轮转
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional, TextIO
+
+from aiohttp.web_log import AccessLogger
+
+_STOP = object()
+
+# 当前正在处理的请求路径，由中间件和 PathAccessLogger 设置，供 SamplingFilter 按路径抽样
+request_path: 'contextvars.ContextVar[Optional[str]]' = contextvars.ContextVar('request_path', default=None)
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志一行 JSON；记录带有 fields 属性时直接展开为字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                    + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        fields = getattr(record, 'fields', None)
+        if isinstance(fields, dict):
+            data.update(fields)
+        else:
+            data['message'] = record.getMessage()
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按请求路径前缀抽样（最长前缀优先），例如 {"/__health": 0, "/": 0.1} 丢弃健康检查、
+    其余请求只保留一成；请求之外的日志（启动、配置重载等）和 WARNING 及以上级别总是保留
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # 按前缀长度降序，第一个匹配的就是最长前缀
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        path = request_path.get()
+        if path is None:
+            return True
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate >= 1 or random.random() < rate
+        return True
+
+
+class PathAccessLogger(AccessLogger):
+    """访问日志在请求处理完之后输出，此时重新设置请求路径，使访问日志也能按路径抽样"""
+
+    def log(self, request, response, time: float):
+        token = request_path.set(request.path)
+        try:
+            super().log(request, response, time)
+        finally:
+            request_path.reset(token)
+
+
+class QueueLogHandler(logging.Handler):
+    """只负责把记录放进队列，格式化和 IO 都在写入线程中完成"""
+
+    def __init__(self, writer: 'AsyncLogWriter'):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.writer.queue.put_nowait(record)
+        except queue.Full:
+            self.writer.dropped += 1
+
+    # 基类的 handle 会为每条记录加锁，入队本身是线程安全的，不需要
+    def handle(self, record: logging.LogRecord) -> bool:
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+
+class AsyncLogWriter(threading.Thread):
+    """后台写入线程：一次取出队列中积压的所有记录，合并成一次写入"""
+
+    def __init__(self, formatter: logging.Formatter, filename: Optional[str] = None,
+                 stream: Optional[TextIO] = None, max_bytes: int = 0, backup_count: int = 5,
+                 batch_size: int = 512, queue_size: int = 10000):
+        super().__init__(name='log-writer', daemon=True)
+        self.formatter = formatter
+        self.filename = filename
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._file: Optional[TextIO] = None
+        if filename:
+            self._file = open(filename, 'a', encoding='utf-8')
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(record is _STOP for record in batch):
+                batch = [record for record in batch if record is not _STOP]
+                stopping = True
+            self._write_batch(batch)
+        self._close()
+
+    def _write_batch(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception as e:
+                lines.append(f'Failed to format log record {record.msg!r}: {e}')
+        if self.dropped != self._reported_dropped:
+            lines.append(f'Log queue full, dropped {self.dropped - self._reported_dropped} records')
+            self._reported_dropped = self.dropped
+        if not lines:
+            return
+        text = '\n'.join(lines) + '\n'
+        try:
+            if self._file is not None:
+                self._rotate_if_needed(len(text.encode('utf-8')))
+                self._file.write(text)
+                self._file.flush()
+            if self.stream is not None:
+                self.stream.write(text)
+                self.stream.flush()
+        except OSError as e:
+            sys.stderr.write(f'Failed to write log batch: {e}\n')
+
+    def _rotate_if_needed(self, incoming: int):
+        position = self._file.tell()
+        # 空文件不轮转，单批超过上限时整批写入当前文件
+        if not self.max_bytes or position == 0 or position + incoming <= self.max_bytes:
+            return
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f'{self.filename}.{index}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.filename}.{index + 1}')
+            os.replace(self.filename, f'{self.filename}.1')
+        self._file = open(self.filename, 'w' if self.backup_count <= 0 else 'a', encoding='utf-8')
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stop(self, timeout: float = 5):
+        """写完队列中剩余的记录后停止"""
+        self.queue.put(_STOP)
+        self.join(timeout)
+
+
+def setup_async_logging(log_config: dict, filename: Optional[str] = None,
+                        stream: Optional[TextIO] = None, parse_size=int) -> AsyncLogWriter:
+    """
+    用队列 + 后台写入线程替换根日志器的处理器，返回写入线程（退出前调用 stop()）
+    :param log_config: config.json 的 logging 段
+    :param filename: 日志文件，按 logging.max_bytes 轮转
+    :param stream: 同时（或仅）写到的终端流
+    """
+    if log_config.get('json', False):
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            log_config.get('format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        )
+    writer = AsyncLogWriter(
+        formatter,
+        filename=filename,
+        stream=stream,
+        max_bytes=parse_size(log_config.get('max_bytes', 0)),
+        backup_count=log_config.get('backup_count', 5),
+        batch_size=log_config.get('batch_size', 512),
+        queue_size=log_config.get('queue_size', 10000),
+    )
+    handler = QueueLogHandler(writer)
+    sampling = log_config.get('sampling')
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+        existing.close()
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, log_config.get('level', 'INFO').upper()))
+    writer.start()
+    return writer
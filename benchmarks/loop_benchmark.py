@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+事件循环对比基准测试 - 分别用标准 asyncio 和 uvloop 启动 CORS 代理，
+通过本地上游桩服务测量每秒请求数
+
+用法: python benchmarks/loop_benchmark.py --concurrency 200 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from stub_upstream import run as run_upstream
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROXY_SCRIPT = os.path.join(ROOT_DIR, 'cors_proxy_server.py')
+
+
+async def wait_for_port(url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} 未能在 {timeout} 秒内启动")
+
+
+async def measure(url: str, concurrency: int, duration: float) -> dict:
+    """以固定并发持续请求 duration 秒，返回请求数和每秒请求数"""
+    completed = 0
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.monotonic() + duration
+
+        async def client():
+            nonlocal completed, errors
+            while time.monotonic() < deadline:
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        if response.status == 200:
+                            completed += 1
+                        else:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return {'requests': completed, 'errors': errors, 'rps': round(completed / elapsed, 1)}
+
+
+def benchmark_loop(loop: str, config_path: str, proxy_port: int, upstream_port: int,
+                   concurrency: int, duration: float) -> dict:
+    process = subprocess.Popen(
+        [sys.executable, PROXY_SCRIPT, '--port', str(proxy_port),
+         '--config', config_path, '--loop', loop],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{proxy_port}/http://127.0.0.1:{upstream_port}/v3/chat'
+    try:
+        asyncio.run(wait_for_port(url))
+        # 预热连接池
+        asyncio.run(measure(url, concurrency, 1))
+        return asyncio.run(measure(url, concurrency, duration))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CORS 代理事件循环基准测试')
+    parser.add_argument('--concurrency', type=int, default=100, help='并发连接数')
+    parser.add_argument('--duration', type=float, default=10, help='每轮测试时长（秒）')
+    parser.add_argument('--proxy-port', type=int, default=18080)
+    parser.add_argument('--upstream-port', type=int, default=18090)
+    args = parser.parse_args()
+
+    loops = ['asyncio']
+    try:
+        import uvloop  # noqa: F401
+        loops.append('uvloop')
+    except ImportError:
+        print("⚠️  未安装 uvloop（pip install uvloop），只测试标准 asyncio 事件循环")
+
+    # 关闭限流、缓存和访问日志，只测量转发路径本身
+    config = {
+        'security': {'rate_limit': {'enabled': False}},
+        'cache': {'enabled': False},
+        'performance': {'access_log': False},
+    }
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(config, f)
+        config_path = f.name
+
+    upstream = multiprocessing.Process(target=run_upstream, args=(args.upstream_port,), daemon=True)
+    upstream.start()
+
+    results = {}
+    try:
+        asyncio.run(wait_for_port(f'http://127.0.0.1:{args.upstream_port}/v3/chat'))
+        for loop in loops:
+            print(f"🚀 测试 {loop} 事件循环（并发 {args.concurrency}，{args.duration} 秒）...")
+            results[loop] = benchmark_loop(loop, config_path, args.proxy_port, args.upstream_port,
+                                           args.concurrency, args.duration)
+            print(f"   • {results[loop]['rps']} 请求/秒，"
+                  f"成功 {results[loop]['requests']}，失败 {results[loop]['errors']}")
+    finally:
+        upstream.terminate()
+        os.remove(config_path)
+
+    if 'uvloop' in results and results['asyncio']['rps']:
+        speedup = results['uvloop']['rps'] / results['asyncio']['rps']
+        print(f"\n📊 uvloop 相对 asyncio: {speedup:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+CORS 代理与 JWT token 服务的基准测试
+
+启动本地上游桩服务（stub_upstream.py）、CORS 代理和 JWTOauth 异步服务，
+对每个场景按指定并发持续压测，统计每秒请求数、延迟分位数以及被测进程的 CPU 和内存，
+结果保存为 JSON，可以用 --baseline 与上一次的结果对比。
+
+用法:
+    python benchmarks/run_benchmarks.py --concurrency 10,100 --duration 10
+    python benchmarks/run_benchmarks.py --scenarios proxy_sse --baseline benchmarks/results/上次.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from stub_upstream import run as run_upstream
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROXY_SCRIPT = os.path.join(ROOT_DIR, 'cors_proxy_server.py')
+JWT_SCRIPT = os.path.join(ROOT_DIR, 'JWTOauth', 'main.py')
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+CHAT_BODY = {
+    'bot_id': 'bot_bench',
+    'user_id': 'user_bench',
+    'stream': False,
+    'additional_messages': [{'role': 'user', 'content': '你好', 'content_type': 'text'}],
+}
+
+# 场景 -> 被测服务、请求方法、路径和附加请求头
+SCENARIOS = {
+    'proxy_json': {'target': 'proxy', 'method': 'POST', 'path': '/v3/chat', 'json': CHAT_BODY},
+    'proxy_sse': {'target': 'proxy', 'method': 'POST', 'path': '/v3/chat/stream',
+                  'json': dict(CHAT_BODY, stream=True)},
+    'proxy_asset': {'target': 'proxy', 'method': 'GET', 'path': '/assets/large.js'},
+    'proxy_asset_uncached': {'target': 'proxy', 'method': 'GET', 'path': '/assets/large.js',
+                             'headers': {'Cache-Control': 'no-store'}},
+    'jwt_token': {'target': 'jwt', 'method': 'GET', 'path': '/callback',
+                  'headers': {'X-Requested-With': 'XMLHttpRequest'}},
+}
+
+
+# ----------------------------------------------------------------------
+# 被测进程的 CPU 和内存
+# ----------------------------------------------------------------------
+
+class ProcessSampler:
+    """统计进程（及其子进程）在压测期间的 CPU 占用和内存峰值；优先使用 psutil，否则读取 /proc"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        try:
+            import psutil
+            self._psutil = psutil
+        except ImportError:
+            self._psutil = None
+        self.rss_peak = 0
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+
+    def _pids(self) -> List[int]:
+        if self._psutil is not None:
+            try:
+                process = self._psutil.Process(self.pid)
+                return [self.pid] + [child.pid for child in process.children(recursive=True)]
+            except self._psutil.Error:
+                return [self.pid]
+        try:
+            with open(f'/proc/{self.pid}/task/{self.pid}/children') as f:
+                return [self.pid] + [int(pid) for pid in f.read().split()]
+        except OSError:
+            return [self.pid]
+
+    def _cpu_seconds(self) -> Optional[float]:
+        total = 0.0
+        for pid in self._pids():
+            try:
+                if self._psutil is not None:
+                    times = self._psutil.Process(pid).cpu_times()
+                    total += times.user + times.system
+                else:
+                    with open(f'/proc/{pid}/stat') as f:
+                        fields = f.read().rsplit(')', 1)[1].split()
+                    total += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+            except Exception:
+                # 子进程可能已经退出
+                continue
+        return total
+
+    def _rss_bytes(self) -> Optional[int]:
+        total = 0
+        for pid in self._pids():
+            try:
+                if self._psutil is not None:
+                    total += self._psutil.Process(pid).memory_info().rss
+                else:
+                    with open(f'/proc/{pid}/status') as f:
+                        for line in f:
+                            if line.startswith('VmRSS:'):
+                                total += int(line.split()[1]) * 1024
+                                break
+            except Exception:
+                # 子进程可能已经退出
+                continue
+        return total
+
+    def start(self):
+        self._cpu_start = self._cpu_seconds() or 0.0
+        self._wall_start = time.monotonic()
+        self.rss_peak = self._rss_bytes() or 0
+
+    def sample(self):
+        rss = self._rss_bytes()
+        if rss:
+            self.rss_peak = max(self.rss_peak, rss)
+
+    def result(self) -> dict:
+        cpu = self._cpu_seconds()
+        wall = time.monotonic() - self._wall_start
+        return {
+            'cpu_percent': round((cpu - self._cpu_start) / wall * 100, 1) if cpu is not None and wall > 0 else None,
+            'rss_peak_mb': round(self.rss_peak / 1024 / 1024, 1) if self.rss_peak else None,
+        }
+
+
+# ----------------------------------------------------------------------
+# 压测
+# ----------------------------------------------------------------------
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        'p50': round(rank(50) * 1000, 2),
+        'p90': round(rank(90) * 1000, 2),
+        'p99': round(rank(99) * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+async def run_load(url: str, scenario: dict, concurrency: int, duration: float,
+                   sampler: Optional[ProcessSampler]) -> dict:
+    """以固定并发持续请求 duration 秒；延迟从发出请求到读完响应体，ttfb 到收到第一块响应体"""
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    errors = 0
+    received = 0
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        deadline = time.monotonic() + duration
+
+        async def client():
+            nonlocal errors, received
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with session.request(scenario['method'], url, json=scenario.get('json'),
+                                               headers=scenario.get('headers')) as response:
+                        first = True
+                        async for chunk in response.content.iter_any():
+                            if first:
+                                ttfbs.append(time.perf_counter() - started)
+                                first = False
+                            received += len(chunk)
+                        if response.status >= 400:
+                            errors += 1
+                            continue
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        async def sample():
+            while time.monotonic() < deadline:
+                sampler.sample()
+                await asyncio.sleep(0.2)
+
+        if sampler is not None:
+            sampler.start()
+        started = time.monotonic()
+        tasks = [client() for _ in range(concurrency)]
+        if sampler is not None:
+            tasks.append(sample())
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'throughput_mb_s': round(received / elapsed / 1024 / 1024, 2),
+        'latency_ms': percentiles(latencies),
+        'ttfb_ms': percentiles(ttfbs),
+    }
+    if sampler is not None:
+        result['server'] = sampler.result()
+    return result
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"进程已退出，退出码 {process.returncode}")
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} 未能在 {timeout} 秒内启动")
+
+
+# ----------------------------------------------------------------------
+# 被测服务
+# ----------------------------------------------------------------------
+
+def start_proxy(args, workdir: str) -> subprocess.Popen:
+    config = {
+        'security': {'rate_limit': {'enabled': False}},
+        'cache': {'enabled': True, 'memory_size': '256MB', 'disk_size': '512MB',
+                  'directory': os.path.join(workdir, 'cache')},
+        'performance': {'access_log': False},
+        'logging': {'level': 'WARNING', 'async': True},
+    }
+    config_path = os.path.join(workdir, 'proxy_config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    command = [sys.executable, PROXY_SCRIPT, '--port', str(args.proxy_port),
+               '--config', config_path, '--workers', str(args.workers)]
+    if args.loop:
+        command += ['--loop', args.loop]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_jwt_server(args, workdir: str) -> subprocess.Popen:
+    """用临时生成的密钥和指向桩服务的配置启动 JWTOauth 异步服务"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode('ascii')
+    upstream = f'http://127.0.0.1:{args.upstream_port}'
+    config = {
+        'client_type': 'jwt',
+        'client_id': 'bench_client',
+        'coze_www_base': upstream,
+        'coze_api_base': upstream,
+        'private_key': private_key,
+        'public_key_id': 'bench_key',
+    }
+    config_path = os.path.join(workdir, 'coze_oauth_config.json')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    env = dict(os.environ, COZE_OAUTH_CONFIG=config_path)
+    return subprocess.Popen(
+        [sys.executable, JWT_SCRIPT, '--async', '--port', str(args.jwt_port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_process(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ----------------------------------------------------------------------
+# 结果
+# ----------------------------------------------------------------------
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_with_baseline(results: List[dict], baseline_path: str):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline.get('results', [])}
+
+    print(f"\n📊 与基线 {baseline_path}（提交 {baseline.get('meta', {}).get('git_commit')}）对比:")
+    for result in results:
+        old = previous.get((result['scenario'], result['concurrency']))
+        if old is None:
+            continue
+
+        def change(new_value, old_value) -> str:
+            if not old_value or new_value is None:
+                return 'n/a'
+            return f'{(new_value - old_value) / old_value * 100:+.1f}%'
+
+        print(f"   • {result['scenario']} @ {result['concurrency']}: "
+              f"RPS {old['rps']} → {result['rps']} ({change(result['rps'], old['rps'])}), "
+              f"p99 {old['latency_ms'].get('p99')} → {result['latency_ms'].get('p99')} ms "
+              f"({change(result['latency_ms'].get('p99'), old['latency_ms'].get('p99'))})")
+
+
+def print_result(result: dict):
+    latency = result['latency_ms']
+    server = result.get('server') or {}
+    print(f"   • {result['rps']} 请求/秒，p50 {latency.get('p50')} ms，p99 {latency.get('p99')} ms，"
+          f"失败 {result['errors']}，CPU {server.get('cpu_percent')}%，内存峰值 {server.get('rss_peak_mb')} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CORS 代理与 JWT token 服务基准测试')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f'逗号分隔的场景列表，可选: {", ".join(SCENARIOS)}')
+    parser.add_argument('--concurrency', default='50', help='并发数，逗号分隔可测试多档')
+    parser.add_argument('--duration', type=float, default=10, help='每个场景每档并发的测试时长（秒）')
+    parser.add_argument('--warmup', type=float, default=1, help='正式测试前的预热时长（秒）')
+    parser.add_argument('--workers', type=int, default=1, help='代理的 --workers')
+    parser.add_argument('--loop', choices=('auto', 'uvloop', 'asyncio'), help='代理的 --loop')
+    parser.add_argument('--sse-events', type=int, default=20, help='每个 SSE 响应的事件数')
+    parser.add_argument('--sse-interval', type=float, default=0.02, help='SSE 事件间隔（秒）')
+    parser.add_argument('--asset-size', type=int, default=2 * 1024 * 1024, help='大资源的字节数')
+    parser.add_argument('--proxy-port', type=int, default=18080)
+    parser.add_argument('--jwt-port', type=int, default=18081)
+    parser.add_argument('--upstream-port', type=int, default=18090)
+    parser.add_argument('--output', help='结果文件路径，默认 benchmarks/results/<时间>.json')
+    parser.add_argument('--baseline', help='与之对比的上一次结果文件')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    concurrency_levels = [int(value) for value in args.concurrency.split(',')]
+
+    upstream = multiprocessing.Process(
+        target=run_upstream,
+        args=(args.upstream_port, args.sse_events, args.sse_interval, args.asset_size),
+        daemon=True,
+    )
+    upstream.start()
+
+    results: List[dict] = []
+    skipped: Dict[str, str] = {}
+    servers: Dict[str, Optional[subprocess.Popen]] = {}
+    base_urls = {
+        'proxy': f'http://127.0.0.1:{args.proxy_port}/http://127.0.0.1:{args.upstream_port}',
+        'jwt': f'http://127.0.0.1:{args.jwt_port}',
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            asyncio.run(wait_until_ready(f'http://127.0.0.1:{args.upstream_port}/v3/chat', None))
+
+            targets = {SCENARIOS[name]['target'] for name in scenarios}
+            if 'proxy' in targets:
+                servers['proxy'] = start_proxy(args, workdir)
+                asyncio.run(wait_until_ready(f'http://127.0.0.1:{args.proxy_port}/', servers['proxy']))
+            if 'jwt' in targets:
+                try:
+                    servers['jwt'] = start_jwt_server(args, workdir)
+                    asyncio.run(wait_until_ready(f'http://127.0.0.1:{args.jwt_port}/', servers['jwt']))
+                except (ImportError, RuntimeError) as e:
+                    print(f"⚠️  无法启动 JWTOauth 服务，跳过 JWT 场景: {e}")
+                    stop_process(servers.pop('jwt', None))
+                    for name in scenarios:
+                        if SCENARIOS[name]['target'] == 'jwt':
+                            skipped[name] = str(e)
+
+            for name in scenarios:
+                if name in skipped:
+                    continue
+                scenario = SCENARIOS[name]
+                server = servers[scenario['target']]
+                url = base_urls[scenario['target']] + scenario['path']
+                for concurrency in concurrency_levels:
+                    print(f"🚀 {name}（并发 {concurrency}，{args.duration} 秒）...")
+                    if args.warmup > 0:
+                        asyncio.run(run_load(url, scenario, concurrency, args.warmup, None))
+                    result = asyncio.run(run_load(url, scenario, concurrency, args.duration,
+                                                  ProcessSampler(server.pid)))
+                    result = {'scenario': name, 'concurrency': concurrency, **result}
+                    results.append(result)
+                    print_result(result)
+        finally:
+            for process in servers.values():
+                stop_process(process)
+            upstream.terminate()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'duration': args.duration,
+            'concurrency': concurrency_levels,
+            'proxy_workers': args.workers,
+            'proxy_loop': args.loop,
+            'sse_events': args.sse_events,
+            'sse_interval': args.sse_interval,
+            'asset_size': args.asset_size,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 结果已保存到 {output}")
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+基准测试用的本地上游桩服务，模拟 Coze 的几类响应：
+- POST /v3/chat                     普通 JSON 响应
+- POST /v3/chat/stream              SSE 流，按固定间隔推送若干事件
+- GET  /assets/large.js             大静态资源，带 ETag 和 Cache-Control
+- POST /api/permission/oauth2/token JWT 换取 access token
+
+用法: python benchmarks/stub_upstream.py --port 18090
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+from aiohttp import web
+
+
+def create_app(sse_events: int = 20, sse_interval: float = 0.02,
+               asset_size: int = 2 * 1024 * 1024) -> web.Application:
+    asset_body = (b'/* benchmark asset */\n' + b'x' * asset_size)[:asset_size]
+    asset_etag = '"' + hashlib.sha256(asset_body).hexdigest()[:16] + '"'
+
+    async def chat(request: web.Request) -> web.Response:
+        return web.json_response({
+            'code': 0,
+            'msg': '',
+            'data': {
+                'id': 'chat_bench',
+                'conversation_id': 'conversation_bench',
+                'bot_id': 'bot_bench',
+                'status': 'completed',
+                'created_at': int(time.time()),
+            },
+        })
+
+    async def chat_stream(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+        })
+        await response.prepare(request)
+        for index in range(sse_events):
+            data = json.dumps({'id': 'message_bench', 'type': 'answer', 'content': f'片段{index} '},
+                              ensure_ascii=False)
+            await response.write(f'event: conversation.message.delta\ndata: {data}\n\n'.encode('utf-8'))
+            await asyncio.sleep(sse_interval)
+        await response.write(b'event: done\ndata: [DONE]\n\n')
+        await response.write_eof()
+        return response
+
+    async def asset(request: web.Request) -> web.Response:
+        headers = {'ETag': asset_etag, 'Cache-Control': 'public, max-age=3600'}
+        if request.headers.get('If-None-Match') == asset_etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=asset_body, content_type='application/javascript', headers=headers)
+
+    async def oauth_token(request: web.Request) -> web.Response:
+        return web.json_response({
+            'access_token': 'bench_' + hashlib.sha1(str(time.time()).encode()).hexdigest(),
+            'expires_in': int(time.time()) + 900,
+            'token_type': 'Bearer',
+        })
+
+    app = web.Application()
+    app.router.add_post('/v3/chat', chat)
+    app.router.add_get('/v3/chat', chat)
+    app.router.add_post('/v3/chat/stream', chat_stream)
+    app.router.add_get('/v3/chat/stream', chat_stream)
+    app.router.add_get('/assets/large.js', asset)
+    app.router.add_post('/api/permission/oauth2/token', oauth_token)
+    return app
+
+
+def run(port: int, sse_events: int = 20, sse_interval: float = 0.02, asset_size: int = 2 * 1024 * 1024):
+    web.run_app(create_app(sse_events, sse_interval, asset_size),
+                host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='基准测试用的 Coze 上游桩服务')
+    parser.add_argument('--port', type=int, default=18090)
+    parser.add_argument('--sse-events', type=int, default=20)
+    parser.add_argument('--sse-interval', type=float, default=0.02)
+    parser.add_argument('--asset-size', type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+    run(args.port, args.sse_events, args.sse_interval, args.asset_size)
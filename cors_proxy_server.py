@@ -9,10 +9,25 @@ import aiohttp
 import aiohttp.web
 import urllib.parse
 import logging
+import logging.handlers
 import json
-from typing import Dict, Optional, List
+import os
+import re
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional, List, AsyncIterator
 import ssl
 import certifi
+from multidict import CIMultiDict
+
+from proxy_cache import FLIGHT_ABANDONED, NOT_MODIFIED_HEADERS, ResponseCache
+from rate_limiter import RateLimiter
+from domain_matcher import DomainMatcher
+from proxy_metrics import ProxyMetrics, RequestTimings
+from proxy_encoding import accepts_encoding, add_vary, create_decoder, strip_encoding_headers
+from async_logging import PathAccessLogger, SamplingFilter, request_path, setup_async_logging
 
 # 配置日志
 logging.basicConfig(
@@ -20,13 +35,195 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger('cors-proxy')
+# 每个请求一行 JSON 的阶段耗时日志（performance.timing_log 开启时输出）
+timing_logger = logging.getLogger('cors-proxy.timing')
+
+# 逐跳头部，不应原样转发给浏览器
+# （响应体按原始字节转发，Content-Encoding/Content-Length 保留，只在解码时去掉）
+HOP_BY_HOP_HEADERS = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade'
+})
+
+# 会把请求体转发给上游的方法，其余方法（GET/HEAD）不读取请求体
+BODY_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+# 这些响应按协议没有响应体，只转发响应头
+BODILESS_STATUS = frozenset({204, 304})
+
+# WebSocket 握手头由 aiohttp 重新生成，不转发浏览器的
+WEBSOCKET_SKIP_HEADERS = frozenset({
+    'host', 'connection', 'upgrade', 'content-length', 'transfer-encoding', 'accept-encoding',
+    'sec-websocket-key', 'sec-websocket-version', 'sec-websocket-extensions', 'sec-websocket-protocol'
+})
+
+# 只在本端表示连接状态、不能写进关闭帧的关闭码（RFC 6455 7.4.1）
+_RESERVED_CLOSE_CODES = frozenset({1004, 1005, 1006, 1015})
+
+# 默认配置文件路径（与本文件同目录）
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> dict:
+    """加载配置文件，文件不存在时返回空配置"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"Config file {config_path} not found, using defaults")
+        return {}
+
+
+def parse_size(value) -> int:
+    """把 '10MB' 这类大小字符串转换为字节数"""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*', str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    if unit in ('K', 'M', 'G'):
+        unit += 'B'
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def install_event_loop(mode: str = 'asyncio') -> str:
+    """
+    按 mode 设置事件循环策略，返回实际使用的事件循环名称。
+    'auto' 在安装了 uvloop 时使用 uvloop；'uvloop' 未安装时退回标准 asyncio 并给出警告。
+    需要在 asyncio.run() 之前调用。
+    """
+    if mode not in ('auto', 'uvloop', 'asyncio'):
+        raise ValueError(f"Invalid event loop: {mode}")
+    if mode == 'asyncio':
+        return 'asyncio'
+    try:
+        import uvloop
+    except ImportError:
+        if mode == 'uvloop':
+            logger.warning("uvloop is not installed, falling back to the default asyncio loop")
+        return 'asyncio'
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return 'uvloop'
+
+
+class RequestTooLarge(Exception):
+    """请求体超过 max_request_size 限制"""
+
+
+class DecodedCacheResponse(aiohttp.web.StreamResponse):
+    """
+    缓存的是压缩字节而客户端不接受该编码时使用：aiohttp 发送响应时逐块解码写出，
+    不在事件循环中一次性解压整个响应体
+    """
+
+    def __init__(self, body: bytes, decoder, method: str, chunk_size: int, metrics, **kwargs):
+        super().__init__(**kwargs)
+        self._pending_body = body
+        self._decoder = decoder
+        self._method = method
+        self._chunk_size = chunk_size
+        self._metrics = metrics
+
+    async def write_eof(self, data: bytes = b''):
+        body, self._pending_body = self._pending_body, None
+        if body is not None and self._method != 'HEAD':
+            for start in range(0, len(body), self._chunk_size):
+                await self._write_decoded(self._decoder.decompress(body[start:start + self._chunk_size]))
+            await self._write_decoded(self._decoder.flush())
+        await super().write_eof(data)
+
+    async def _write_decoded(self, chunk: bytes):
+        if chunk:
+            await self.write(chunk)
+            self._metrics.bytes_out += len(chunk)
+
 
 class CORSProxyServer:
-    def __init__(self, host: str = '127.0.0.1', port: int = 8080):
+    # 每次从上游读取并写给浏览器的最大块大小（字节），限制单请求的缓冲量
+    STREAM_CHUNK_SIZE = 64 * 1024
+    # 建立上游连接的超时时间（秒）
+    CONNECT_TIMEOUT = 10
+    # 两次读取上游数据之间允许的最长空闲时间（秒），流式响应不设总超时
+    READ_TIMEOUT = 30
+    
+    # 未配置 security.max_request_size 时的请求体上限
+    DEFAULT_MAX_REQUEST_SIZE = 10 * 1024 * 1024
+    # 检查配置文件是否修改的间隔（秒）
+    CONFIG_RELOAD_INTERVAL = 2
+    # 停止时等待在途请求完成的最长时间（秒）
+    SHUTDOWN_TIMEOUT = 30
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, config: Optional[dict] = None,
+                 config_path: Optional[str] = None, shared_state: Optional[dict] = None):
+        """
+        :param shared_state: 多进程模式下由主进程创建的共享状态，传入后以 SO_REUSEPORT 监听，
+                             限流计数和缓存索引在各 worker 之间共享
+        """
         self.host = host
         self.port = port
-        self.app = aiohttp.web.Application()
+        self.config = config or {}
+        self.config_path = config_path
+        self.reuse_port = shared_state is not None
+        # 就绪检查用到的启动时间和配置加载状态
+        self.started_at = time.time()
+        self.config_loaded_at = time.time() if self.config else None
+        self.config_error: Optional[str] = None
+        
+        security_config = self.config.get('security', {})
+        self.max_request_size = parse_size(
+            security_config.get('max_request_size', self.DEFAULT_MAX_REQUEST_SIZE)
+        )
+        
+        # 上游连接池配置（config.json 的 performance 段）
+        performance_config = self.config.get('performance', {})
+        self.read_timeout = performance_config.get('timeout', self.READ_TIMEOUT)
+        self.max_connections = performance_config.get('max_connections', 100)
+        self.max_connections_per_host = performance_config.get('max_connections_per_host', 0)
+        self.keep_alive = performance_config.get('keep_alive', True)
+        self.keepalive_timeout = performance_config.get('keepalive_timeout', 30)
+        self.dns_cache_ttl = performance_config.get('dns_cache_ttl', 300)
+        # 浏览器到代理这一侧的 keep-alive 时间和访问日志开关
+        self.client_keepalive_timeout = performance_config.get('client_keepalive_timeout', 75)
+        self.access_log = performance_config.get('access_log', True)
+        # 各阶段耗时：Server-Timing 响应头与结构化日志
+        self.server_timing = performance_config.get('server_timing', True)
+        self.timing_log = performance_config.get('timing_log', False)
+        self.pool_counters = {'connections_created': 0, 'connections_reused': 0}
+        # 按客户端IP和目标主机限流（config.json 的 security.rate_limit 段）
+        self.rate_limiter = RateLimiter.from_config(
+            security_config.get('rate_limit', {}),
+            shared_state.get('rate_limit') if shared_state is not None else None
+        )
+        
+        # WebSocket 中继（config.json 的 websocket 段）
+        websocket_config = self.config.get('websocket', {})
+        self.websocket_enabled = websocket_config.get('enabled', True)
+        self.websocket_max_frame_size = parse_size(websocket_config.get('max_frame_size', '4MB'))
+        self.websocket_heartbeat = websocket_config.get('heartbeat', 30)
+        self.websocket_connect_timeout = websocket_config.get('connect_timeout', self.CONNECT_TIMEOUT)
+        # 正在中继的浏览器端连接，关闭服务器时通知它们
+        self.websockets = set()
+        
+        # 请求计数、延迟直方图等 Prometheus 指标（/__metrics）
+        self.metrics = ProxyMetrics()
+        
+        middlewares = [self.log_context_middleware, self.metrics_middleware]
+        if self.rate_limiter is not None:
+            middlewares.append(self.rate_limit_middleware)
+        self.app = aiohttp.web.Application(middlewares=middlewares)
+        self.app.on_shutdown.append(self.close_websockets)
         self.session: Optional[aiohttp.ClientSession] = None
+        self._runner: Optional[aiohttp.web.AppRunner] = None
+        self._watcher: Optional[asyncio.Task] = None
+        
+        # 静态资源响应缓存（config.json 的 cache 段）
+        self.cache = ResponseCache.from_config(
+            self.config.get('cache', {}), os.path.dirname(DEFAULT_CONFIG_PATH), parse_size,
+            shared=self.reuse_port
+        )
         
         # 设置路由
         self.setup_routes()
@@ -39,60 +236,344 @@ class CORSProxyServer:
             'localhost',
             '127.0.0.1'
         ]
+        
+        # 域名检查（security.enforce_domain_check 开启时生效），规则编译成匹配器
+        self.enforce_domain_check = security_config.get('enforce_domain_check', False)
+        self.domain_matcher = DomainMatcher.from_config(security_config, self.allowed_domains)
+        self._config_mtime = self._get_config_mtime()
     
     def setup_routes(self):
         """设置HTTP路由"""
         self.app.router.add_get('/', self.handle_root)
-        self.app.router.add_get('/{path:.*}', self.handle_proxy_get)
+        self.app.router.add_get('/__metrics', self.handle_metrics)
+        self.app.router.add_get('/__health', self.handle_health)
+        self.app.router.add_get('/__ready', self.handle_ready)
+        # HEAD 单独注册，按 HEAD 转发给上游，不下载响应体
+        self.app.router.add_get('/{path:.*}', self.handle_proxy_get, allow_head=False)
+        self.app.router.add_head('/{path:.*}', self.handle_proxy_head)
         self.app.router.add_post('/{path:.*}', self.handle_proxy_post)
         self.app.router.add_put('/{path:.*}', self.handle_proxy_put)
+        self.app.router.add_patch('/{path:.*}', self.handle_proxy_patch)
         self.app.router.add_delete('/{path:.*}', self.handle_proxy_delete)
         self.app.router.add_options('/{path:.*}', self.handle_options)
     
     async def create_session(self):
         """创建HTTP会话"""
         ssl_context = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        self.session = aiohttp.ClientSession(connector=connector)
+        connector_options = {
+            'ssl': ssl_context,
+            'limit': self.max_connections,
+            'limit_per_host': self.max_connections_per_host,
+            'ttl_dns_cache': self.dns_cache_ttl,
+            'use_dns_cache': self.dns_cache_ttl is not None,
+        }
+        if self.keep_alive:
+            connector_options['keepalive_timeout'] = self.keepalive_timeout
+        else:
+            connector_options['force_close'] = True
+        connector = aiohttp.TCPConnector(**connector_options)
+        
+        # 统计新建连接与复用连接的次数，并记录排队、DNS 和建连耗时
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        for phase, start_signal, end_signal in (
+            ('queue', trace_config.on_connection_queued_start, trace_config.on_connection_queued_end),
+            ('dns', trace_config.on_dns_resolvehost_start, trace_config.on_dns_resolvehost_end),
+            ('connect', trace_config.on_connection_create_start, trace_config.on_connection_create_end),
+        ):
+            start_signal.append(self._phase_start_handler(phase))
+            end_signal.append(self._phase_end_handler(phase))
+        
+        # 不自动解压：上游的压缩字节直接转发，需要时才由代理逐块解码
+        self.session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config],
+                                             auto_decompress=False)
+    
+    async def _on_connection_create(self, session, context, params):
+        self.pool_counters['connections_created'] += 1
+    
+    async def _on_connection_reuse(self, session, context, params):
+        self.pool_counters['connections_reused'] += 1
+    
+    @staticmethod
+    def _phase_start_handler(phase: str):
+        async def on_phase_start(session, context, params):
+            if not hasattr(context, 'phase_starts'):
+                context.phase_starts = {}
+            context.phase_starts[phase] = time.perf_counter()
+        return on_phase_start
+    
+    @staticmethod
+    def _phase_end_handler(phase: str):
+        """生成把阶段耗时写入请求 RequestTimings 的 TraceConfig 回调"""
+        async def on_phase_end(session, context, params):
+            timings = context.trace_request_ctx
+            started = getattr(context, 'phase_starts', {}).pop(phase, None)
+            if not isinstance(timings, RequestTimings) or started is None:
+                return
+            duration = time.perf_counter() - started
+            if phase == 'connect':
+                # 建连过程包含 DNS 解析，connect 只保留 TCP 和 TLS 握手的时间
+                duration -= timings.phases.get('dns', 0.0)
+            timings.add(phase, duration)
+        return on_phase_end
+    
+    def pool_stats(self) -> dict:
+        """连接池使用情况"""
+        stats = {
+            'limit': self.max_connections,
+            'limit_per_host': self.max_connections_per_host,
+            'in_use': 0,
+            'idle': 0,
+        }
+        stats.update(self.pool_counters)
+        connector = self.session.connector if self.session else None
+        if connector is not None and not connector.closed:
+            # aiohttp 没有公开连接池占用情况，这里读取其内部结构
+            stats['in_use'] = len(getattr(connector, '_acquired', ()))
+            stats['idle'] = sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+        return stats
     
     async def close_session(self):
         """关闭HTTP会话"""
         if self.session:
             await self.session.close()
     
-    def is_domain_allowed(self, url: str) -> bool:
-        """检查域名是否在白名单中"""
+    def get_target_url(self, request: aiohttp.web.Request) -> Optional[str]:
+        """从请求路径或查询参数中取出目标URL"""
+        path = request.match_info.get('path', '')
+        if not path.startswith(('http://', 'https://', 'ws://', 'wss://')):
+            # 尝试从查询参数获取URL
+            target_url = request.query.get('url') or request.query.get('quest')
+            if not target_url:
+                return None
+        else:
+            target_url = path
+        
+        # 解码URL（如果被编码）
+        if '%' in target_url:
+            target_url = urllib.parse.unquote(target_url)
+        return target_url
+    
+    def get_target_host(self, request: aiohttp.web.Request) -> Optional[str]:
+        """目标URL的主机名，无法解析时返回 None"""
+        target_url = self.get_target_url(request)
+        if not target_url:
+            return None
         try:
-            parsed = urllib.parse.urlparse(url)
-            domain = parsed.netloc
-            
-            # 允许所有域名（在生产环境中应该更严格）
+            return urllib.parse.urlsplit(target_url).hostname
+        except ValueError:
+            return None
+    
+    @aiohttp.web.middleware
+    async def log_context_middleware(self, request: aiohttp.web.Request, handler):
+        """记录当前请求路径，处理过程中的日志按 logging.sampling 的路径规则抽样"""
+        token = request_path.set(request.path)
+        try:
+            return await handler(request)
+        finally:
+            request_path.reset(token)
+    
+    @aiohttp.web.middleware
+    async def metrics_middleware(self, request: aiohttp.web.Request, handler):
+        """统计代理请求的数量、状态码和总耗时"""
+        if 'path' not in request.match_info:
+            return await handler(request)
+        
+        started = time.monotonic()
+        status = 500
+        self.metrics.active_requests += 1
+        try:
+            response = await handler(request)
+            status = 499 if request.get('client_disconnected') else response.status
+            return response
+        except aiohttp.web.HTTPException as e:
+            status = e.status
+            raise
+        except (asyncio.CancelledError, ConnectionResetError):
+            # 浏览器提前断开，沿用 nginx 的 499 约定
+            status = 499
+            raise
+        finally:
+            self.metrics.active_requests -= 1
+            self.metrics.record_request(
+                request.method, status, self.get_target_host(request), time.monotonic() - started
+            )
+    
+    @aiohttp.web.middleware
+    async def rate_limit_middleware(self, request: aiohttp.web.Request, handler):
+        """令牌桶限流中间件，超限时返回 429"""
+        if request.method == 'OPTIONS' or 'path' not in request.match_info:
+            return await handler(request)
+        
+        target_host = self.get_target_host(request)
+        allowed, retry_after = self.rate_limiter.check(request.remote or '', target_host)
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {request.remote} -> {target_host}")
+            response = aiohttp.web.json_response(
+                {'error': 'Too many requests'}, status=429,
+                headers={'Retry-After': str(retry_after)}
+            )
+            return self.add_cors_headers(response)
+        return await handler(request)
+    
+    def is_domain_allowed(self, url: str) -> bool:
+        """检查域名是否在白名单中且不在黑名单中"""
+        if not self.enforce_domain_check:
+            # 允许所有域名（在生产环境中应开启 enforce_domain_check）
             return True
-            
-            # 严格的域名检查（取消注释启用）
-            # for allowed in self.allowed_domains:
-            #     if allowed.startswith('*.'):
-            #         base_domain = allowed[2:]
-            #         if domain.endswith(base_domain):
-            #             return True
-            #     elif domain == allowed:
-            #         return True
-            # return False
-            
-        except Exception:
+        try:
+            return self.domain_matcher.is_allowed(urllib.parse.urlsplit(url).hostname)
+        except ValueError:
             return False
     
-    def add_cors_headers(self, response: aiohttp.web.Response) -> aiohttp.web.Response:
+    def _get_config_mtime(self) -> Optional[float]:
+        if not self.config_path:
+            return None
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return None
+    
+    def reload_domain_rules(self):
+        """重新读取配置文件并替换域名匹配器"""
+        try:
+            config = load_config(self.config_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to reload config {self.config_path}: {e}")
+            self.config_error = str(e)
+            return
+        self.config_error = None
+        self.config_loaded_at = time.time()
+        security_config = config.get('security', {})
+        self.domain_matcher = DomainMatcher.from_config(security_config, self.allowed_domains)
+        self.enforce_domain_check = security_config.get('enforce_domain_check', False)
+        logger.info(f"Reloaded domain rules from {self.config_path}")
+    
+    async def watch_config(self):
+        """定期检查配置文件修改时间，变化时热加载域名规则"""
+        while True:
+            await asyncio.sleep(self.CONFIG_RELOAD_INTERVAL)
+            mtime = self._get_config_mtime()
+            if mtime is not None and mtime != self._config_mtime:
+                self._config_mtime = mtime
+                self.reload_domain_rules()
+    
+    def filter_response_headers(self, upstream_headers) -> CIMultiDict:
+        """过滤上游响应头，去掉逐跳头部和会被重新计算的头部"""
+        headers = CIMultiDict()
+        for name, value in upstream_headers.items():
+            if name.lower() in HOP_BY_HOP_HEADERS:
+                continue
+            headers.add(name, value)
+        return headers
+    
+    async def stream_request_body(self, request: aiohttp.web.Request) -> AsyncIterator[bytes]:
+        """把浏览器请求体逐块转发给上游，同时执行大小限制"""
+        received = 0
+        async for chunk in request.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+            received += len(chunk)
+            self.metrics.bytes_in += len(chunk)
+            if received > self.max_request_size:
+                # 新版 aiohttp 会把这里抛出的异常包装成连接错误，用标记区分上传超限
+                request['body_too_large'] = True
+                raise RequestTooLarge(f"Request body exceeds {self.max_request_size} bytes")
+            yield chunk
+    
+    def client_disconnected(self, request: aiohttp.web.Request, response: Optional[aiohttp.web.StreamResponse],
+                            target_url: str) -> aiohttp.web.StreamResponse:
+        """
+        浏览器在传输过程中断开（例如下载 SDK 时关闭标签页）属于正常情况：记一行 INFO 后正常结束，
+        不把异常抛给 aiohttp（否则会按 ERROR 记录完整堆栈）；指标中按 499 统计
+        """
+        logger.info(f"Client disconnected while streaming from {target_url}")
+        request['client_disconnected'] = True
+        # 连接已断开，aiohttp 收尾时写不出去会静默忽略
+        return response if response is not None else aiohttp.web.Response(status=499)
+    
+    def request_too_large(self, target_url: str) -> aiohttp.web.Response:
+        """流式上传超过 max_request_size 时的 413 响应"""
+        logger.warning(f"Rejected upload to {target_url}: body exceeds {self.max_request_size} bytes")
+        return self.add_cors_headers(aiohttp.web.json_response(
+            {'error': 'Request entity too large'}, status=413
+        ))
+    
+    def is_event_stream(self, resp: aiohttp.ClientResponse) -> bool:
+        """判断上游响应是否为 SSE"""
+        return resp.content_type == 'text/event-stream'
+    
+    def is_chunked_stream(self, resp: aiohttp.ClientResponse) -> bool:
+        """判断上游响应是否为无长度的分块传输（边压缩边发送的 CDN 资源也是这种形式）"""
+        return resp.headers.get('Transfer-Encoding', '').lower() == 'chunked' and \
+            'Content-Length' not in resp.headers
+    
+    def add_cors_headers(self, response: aiohttp.web.StreamResponse) -> aiohttp.web.StreamResponse:
         """添加CORS头到响应"""
         response.headers.update({
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+            'Access-Control-Allow-Methods': 'GET, HEAD, POST, PUT, PATCH, DELETE, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With',
             'Access-Control-Max-Age': '3600',
             'Access-Control-Allow-Credentials': 'true'
         })
         return response
     
+    def set_server_timing(self, response: aiohttp.web.StreamResponse, timings: RequestTimings,
+                          include_total: bool = True):
+        """在响应头发出前写入 Server-Timing"""
+        if self.server_timing:
+            response.headers['Server-Timing'] = timings.server_timing(include_total)
+            # 跨域页面需要这个头才能在 PerformanceResourceTiming 中读到 serverTiming
+            response.headers['Timing-Allow-Origin'] = '*'
+    
+    def log_timings(self, method: str, target_url: str, status: int, timings: RequestTimings,
+                    cache_status: Optional[str] = None):
+        if not self.timing_log:
+            return
+        record = {
+            'method': method,
+            'url': target_url,
+            'status': status,
+            'timings_ms': timings.as_millis(),
+        }
+        if cache_status:
+            record['cache'] = cache_status
+        # JSON 日志格式下直接展开 fields，文本格式下输出 JSON 字符串
+        timing_logger.info(json.dumps(record, ensure_ascii=False), extra={'fields': record})
+    
+    def cached_response(self, request: aiohttp.web.Request, entry, cache_status: str) -> aiohttp.web.StreamResponse:
+        """用缓存条目构造响应；客户端的条件请求与缓存的验证器匹配时直接返回 304，需要解码时返回流式响应"""
+        headers = CIMultiDict(entry.headers)
+        headers.popall('Content-Length', None)
+        body = entry.body
+        decoder = None
+        if not accepts_encoding(request.headers.get('Accept-Encoding'), entry.content_encoding):
+            # 缓存的是压缩字节而客户端不接受该编码（CacheEntry.matches 保证能解码）
+            decoder = create_decoder(entry.content_encoding)
+            strip_encoding_headers(headers)
+        if entry.content_encoding:
+            add_vary(headers, 'Accept-Encoding')
+        
+        if entry.status == 200 and ResponseCache.not_modified(entry, request.headers):
+            response = aiohttp.web.Response(status=304)
+            for name in NOT_MODIFIED_HEADERS:
+                if name in headers:
+                    response.headers[name] = headers[name]
+        elif decoder is not None:
+            # 解码后的长度事先未知，按分块编码发送
+            response = DecodedCacheResponse(
+                body, decoder, request.method, self.STREAM_CHUNK_SIZE, self.metrics,
+                status=entry.status, headers=headers
+            )
+        else:
+            # HEAD 请求由 aiohttp 省略响应体，Content-Length 仍按响应体计算
+            response = aiohttp.web.Response(status=entry.status, body=body, headers=headers)
+            if request.method != 'HEAD':
+                self.metrics.bytes_out += len(body)
+        response.headers['Age'] = str(int(entry.age()))
+        response.headers['X-Cache'] = cache_status
+        return self.add_cors_headers(response)
+    
     async def handle_root(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         """处理根路径请求"""
         info = {
@@ -103,35 +584,116 @@ class CORSProxyServer:
                 'POST /{url}': '代理POST请求',
                 'PUT /{url}': '代理PUT请求',
                 'DELETE /{url}': '代理DELETE请求',
-                'OPTIONS /{url}': '处理预检请求'
+                'OPTIONS /{url}': '处理预检请求',
+                'GET /__metrics': 'Prometheus 指标',
+                'GET /__health': '存活检查',
+                'GET /__ready': '就绪检查'
             },
-            'usage': '将目标URL编码后附加到代理URL后，例如: /https://example.com/api/data'
+            'usage': '将目标URL编码后附加到代理URL后，例如: /https://example.com/api/data',
+            'pool': self.pool_stats()
         }
+        if self.rate_limiter is not None:
+            info['rate_limit'] = {'rejected': self.rate_limiter.rejected}
+        if self.cache is not None:
+            info['cache'] = self.cache.stats()
         return aiohttp.web.json_response(info)
     
+    async def handle_health(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        """存活检查：事件循环能处理请求即可"""
+        response = aiohttp.web.json_response(
+            {'status': 'ok', 'uptime': round(time.time() - self.started_at, 1)},
+            headers={'Cache-Control': 'no-store'}
+        )
+        return self.add_cors_headers(response)
+    
+    async def handle_ready(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        """就绪检查：只读取内存中的状态，不访问上游也不读磁盘"""
+        pool = self.pool_stats()
+        session_open = self.session is not None and not self.session.closed
+        info = {
+            'status': 'ready' if session_open else 'not_ready',
+            'upstream_pool': {
+                'open': session_open,
+                'in_use': pool['in_use'],
+                'idle': pool['idle'],
+                'limit': pool['limit'],
+                'saturated': bool(pool['limit']) and pool['in_use'] >= pool['limit'],
+            },
+            'config': {
+                'path': self.config_path,
+                'loaded': bool(self.config),
+                'loaded_at': self.config_loaded_at,
+                'reload_error': self.config_error,
+            },
+        }
+        response = aiohttp.web.json_response(
+            info, status=200 if session_open else 503, headers={'Cache-Control': 'no-store'}
+        )
+        return self.add_cors_headers(response)
+    
+    async def handle_metrics(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        """以 Prometheus 文本格式输出指标"""
+        pool = self.pool_stats()
+        gauges = {
+            'cors_proxy_client_connections': (
+                'gauge', 'Open client connections',
+                len(self._runner.server.connections) if self._runner and self._runner.server else 0
+            ),
+            'cors_proxy_pool_connections_in_use': ('gauge', 'Upstream connections currently in use', pool['in_use']),
+            'cors_proxy_pool_connections_idle': ('gauge', 'Idle upstream keep-alive connections', pool['idle']),
+            'cors_proxy_pool_connections_limit': ('gauge', 'Upstream connection pool size limit', pool['limit']),
+            'cors_proxy_pool_connections_created_total': (
+                'counter', 'Upstream connections opened', pool['connections_created']
+            ),
+            'cors_proxy_pool_connections_reused_total': (
+                'counter', 'Upstream requests served on a reused connection', pool['connections_reused']
+            ),
+        }
+        if self.rate_limiter is not None:
+            gauges['cors_proxy_rate_limited_total'] = (
+                'counter', 'Requests rejected by the rate limiter', self.rate_limiter.rejected
+            )
+        if self.cache is not None:
+            cache_stats = self.cache.stats()
+            gauges.update({
+                'cors_proxy_cache_hits_total': ('counter', 'Responses served from cache', cache_stats['hits']),
+                'cors_proxy_cache_misses_total': ('counter', 'Cacheable requests sent upstream', cache_stats['misses']),
+                'cors_proxy_cache_revalidations_total': (
+                    'counter', 'Stale entries confirmed by a 304 from upstream', cache_stats['revalidations']
+                ),
+                'cors_proxy_cache_collapsed_total': (
+                    'counter', 'Requests that waited for an identical in-flight upstream fetch', cache_stats['collapsed']
+                ),
+                'cors_proxy_cache_hit_ratio': ('gauge', 'Cache hits / lookups', cache_stats['hit_ratio']),
+                'cors_proxy_cache_memory_bytes': ('gauge', 'Bytes held in the memory cache', cache_stats['memory_bytes']),
+                'cors_proxy_cache_disk_bytes': ('gauge', 'Bytes held in the disk cache', cache_stats['disk_bytes']),
+            })
+        return aiohttp.web.Response(
+            text=self.metrics.render(gauges),
+            content_type='text/plain',
+            headers={'Cache-Control': 'no-store'}
+        )
+    
     async def handle_options(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         """处理OPTIONS预检请求"""
         response = aiohttp.web.Response(status=200)
         return self.add_cors_headers(response)
     
-    async def proxy_request(self, request: aiohttp.web.Request, method: str) -> aiohttp.web.Response:
-        """处理代理请求"""
+    async def proxy_request(self, request: aiohttp.web.Request, method: str) -> aiohttp.web.StreamResponse:
+        """处理代理请求（流式转发上游响应体）"""
+        target_url = None
+        response: Optional[aiohttp.web.StreamResponse] = None
+        timings = RequestTimings()
+        # 由本请求代表相同请求回源时的 key，以及回源得到的缓存条目
+        flight_key: Optional[str] = None
+        flight_entry = None
         try:
             # 获取目标URL
-            path = request.match_info['path']
-            if not path.startswith(('http://', 'https://')):
-                # 尝试从查询参数获取URL
-                target_url = request.query.get('url') or request.query.get('quest')
-                if not target_url:
-                    return aiohttp.web.json_response(
-                        {'error': 'URL parameter required'}, status=400
-                    )
-            else:
-                target_url = path
-            
-            # 解码URL（如果被编码）
-            if '%' in target_url:
-                target_url = urllib.parse.unquote(target_url)
+            target_url = self.get_target_url(request)
+            if not target_url:
+                return aiohttp.web.json_response(
+                    {'error': 'URL parameter required'}, status=400
+                )
             
             # 检查域名是否允许
             if not self.is_domain_allowed(target_url):
@@ -139,64 +701,374 @@ class CORSProxyServer:
                     {'error': 'Domain not allowed'}, status=403
                 )
             
-            logger.info(f"Proxying {method} request to: {target_url}")
+            timings.mark('parse')
+            logger.info("Proxying %s request to: %s", method, target_url)
             
             # 准备请求头（移除不需要的代理头）
-            headers = dict(request.headers)
+            headers = CIMultiDict(request.headers)
             headers_to_remove = [
-                'host', 'connection', 'accept-encoding', 
+                'host', 'connection',
                 'content-length', 'transfer-encoding'
             ]
             for header in headers_to_remove:
-                headers.pop(header, None)
+                headers.popall(header, None)
+            # Accept-Encoding 原样转发，由上游按浏览器支持的编码压缩；
+            # 浏览器没有声明时明确要求不压缩，避免 aiohttp 自动加上 gzip
+            if 'Accept-Encoding' not in headers:
+                headers['Accept-Encoding'] = 'identity'
+            timings.mark('headers')
             
-            # 准备请求数据
+            # 查找缓存（HEAD 复用 GET 的缓存条目）：新鲜的直接返回，过期但有验证器的改为条件请求回源
+            cache_entry = None
+            use_cache = self.cache is not None and method in ('GET', 'HEAD') and \
+                ResponseCache.request_allows_cache(headers)
+            if use_cache:
+                cache_entry = await self.cache.get('GET', target_url, headers)
+                if cache_entry is not None and cache_entry.is_fresh() and \
+                        not ResponseCache.request_requires_revalidation(headers):
+                    self.cache.hits += 1
+                    logger.debug("Cache hit for %s", target_url)
+                    timings.mark('cache')
+                    response = self.cached_response(request, cache_entry, 'HIT')
+                    self.set_server_timing(response, timings)
+                    self.log_timings(method, target_url, response.status, timings, 'HIT')
+                    return response
+                self.cache.misses += 1
+                if cache_entry is not None and cache_entry.has_validators:
+                    # 用缓存自己的验证器回源，客户端的条件头在拿到结果后由代理自己判断
+                    headers.popall('If-None-Match', None)
+                    headers.popall('If-Modified-Since', None)
+                    headers.update(self.cache.conditional_headers(cache_entry))
+                else:
+                    cache_entry = None
+                timings.mark('cache')
+                
+                # 相同的可缓存 GET 正在回源时等它完成，共用同一次上游请求
+                if method == 'GET':
+                    key = self.cache.flight_key(target_url, headers, cache_entry)
+                    flight = self.cache.get_flight(key)
+                    shared_entry = None
+                    if flight is not None:
+                        self.cache.collapsed += 1
+                    while flight is not None:
+                        shared_entry = await self.cache.wait_flight(flight)
+                        if shared_entry is not FLIGHT_ABANDONED:
+                            break
+                        # 代表回源的请求被浏览器取消了，第一个醒来的等待者接替回源，其余的等它
+                        flight = self.cache.get_flight(key)
+                    if flight is not None:
+                        timings.mark('collapsed')
+                        if shared_entry is not None and shared_entry.matches(headers):
+                            response = self.cached_response(request, shared_entry, 'COLLAPSED')
+                            self.set_server_timing(response, timings)
+                            self.log_timings(method, target_url, response.status, timings, 'COLLAPSED')
+                            return response
+                        # 那次回源失败或结果不可共享，自己回源
+                    elif self.cache.collapsible(key) and (cache_entry is not None or not (
+                            'If-None-Match' in headers or 'If-Modified-Since' in headers)):
+                        # 带客户端条件头的请求可能只得到 304，不能代表其他请求回源
+                        self.cache.start_flight(key)
+                        flight_key = key
+            
+            # 准备请求数据：直接以流的形式转发请求体，不在代理中缓冲
             data = None
-            if method in ['POST', 'PUT']:
+            if method in BODY_METHODS:
+                if request.content_length is not None and \
+                        request.content_length > self.max_request_size:
+                    return self.add_cors_headers(aiohttp.web.json_response(
+                        {'error': 'Request entity too large'}, status=413
+                    ))
                 if request.can_read_body:
-                    data = await request.read()
+                    data = self.stream_request_body(request)
+                    if request.content_length is not None:
+                        # 保留原始长度，避免上游收到分块编码
+                        headers['Content-Length'] = str(request.content_length)
             
-            # 发送代理请求
+            # 发送代理请求（ttfb 包含其中的排队、DNS 和建连时间）
             async with self.session.request(
                 method=method,
                 url=target_url,
                 headers=headers,
                 data=data,
-                timeout=aiohttp.ClientTimeout(total=30)
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.CONNECT_TIMEOUT,
+                    sock_read=self.read_timeout
+                ),
+                trace_request_ctx=timings
             ) as resp:
-                # 读取响应内容
-                content = await resp.read()
+                self.metrics.upstream_ttfb.observe(timings.mark('ttfb'))
+                if cache_entry is not None and resp.status == 304:
+                    # 上游确认缓存仍然有效
+                    await self.cache.refresh(cache_entry, resp.headers)
+                    flight_entry = cache_entry
+                    response = self.cached_response(request, cache_entry, 'REVALIDATED')
+                    self.set_server_timing(response, timings)
+                    self.log_timings(method, target_url, response.status, timings, 'REVALIDATED')
+                    return response
+                
+                if self.cache is not None and method not in ('GET', 'HEAD') and resp.status < 400:
+                    self.cache.invalidate(target_url)
                 
-                # 创建响应
-                response = aiohttp.web.Response(
+                # 先发送状态行和响应头，再逐块转发响应体
+                has_body = method != 'HEAD' and resp.status not in BODILESS_STATUS
+                response_headers = self.filter_response_headers(resp.headers)
+                response = aiohttp.web.StreamResponse(
                     status=resp.status,
-                    body=content,
-                    headers=dict(resp.headers)
+                    reason=resp.reason,
+                    headers=response_headers
                 )
+                self.add_cors_headers(response)
                 
-                # 添加CORS头
-                return self.add_cors_headers(response)
+                # 浏览器接受上游的编码时直接转发压缩字节，否则逐块解码成明文
+                encoding = resp.headers.get('Content-Encoding', '')
+                decoder = None
+                if not accepts_encoding(request.headers.get('Accept-Encoding'), encoding):
+                    decoder = create_decoder(encoding)
+                    if decoder is not None:
+                        strip_encoding_headers(response.headers)
+                    else:
+                        logger.warning("Cannot decode '%s' response from %s, passing it through",
+                                       encoding, target_url)
+                if encoding:
+                    add_vary(response.headers, 'Accept-Encoding')
+                
+                # 边转发边收集可缓存的响应体，超过单对象上限就放弃缓存
+                cache_buffer = None
+                if use_cache and has_body and not self.is_event_stream(resp) and \
+                        self.cache.is_cacheable(resp.status, headers, resp.headers):
+                    cache_buffer = []
+                    response.headers['X-Cache'] = 'MISS'
+                elif flight_key is not None:
+                    # 响应不会进入缓存（SSE、no-store/private、错误状态等），立即让等待者各自回源
+                    self.cache.finish_flight(flight_key, None, uncacheable=True)
+                    flight_key = None
+                cached_bytes = 0
+                # 响应体还没开始传输，Server-Timing 只能包含到首字节为止的阶段
+                self.set_server_timing(response, timings, include_total=False)
+                
+                if not has_body:
+                    await response.prepare(request)
+                else:
+                    if self.is_event_stream(resp):
+                        # SSE：禁止浏览器和中间代理缓冲
+                        response.headers['Cache-Control'] = 'no-cache'
+                        response.headers['X-Accel-Buffering'] = 'no'
+                    await response.prepare(request)
+                    if self.is_event_stream(resp) or self.is_chunked_stream(resp):
+                        # SSE/分块流：收到多少转发多少，避免中间缓冲造成逐字延迟
+                        chunks = resp.content.iter_any()
+                    else:
+                        chunks = resp.content.iter_chunked(self.STREAM_CHUNK_SIZE)
+                    async for chunk in chunks:
+                        # 缓存保存上游的原始（压缩）字节
+                        if cache_buffer is not None:
+                            cached_bytes += len(chunk)
+                            if cached_bytes > self.cache.max_object_size:
+                                cache_buffer = None
+                                if flight_key is not None:
+                                    self.cache.finish_flight(flight_key, None, uncacheable=True)
+                                    flight_key = None
+                            else:
+                                cache_buffer.append(chunk)
+                        if decoder is not None:
+                            chunk = decoder.decompress(chunk)
+                        if chunk:
+                            await response.write(chunk)
+                            self.metrics.bytes_out += len(chunk)
+                
+                if decoder is not None and has_body:
+                    tail = decoder.flush()
+                    if tail:
+                        await response.write(tail)
+                        self.metrics.bytes_out += len(tail)
+                await response.write_eof()
+                timings.mark('transfer')
+                self.log_timings(method, target_url, resp.status, timings, response.headers.get('X-Cache'))
+                
+                if cache_buffer is not None:
+                    entry = self.cache.build_entry(
+                        method, target_url, resp.status, headers,
+                        list(response_headers.items()), b''.join(cache_buffer)
+                    )
+                    # 先唤醒等待者，不让它们等磁盘写入
+                    if flight_key is not None:
+                        self.cache.finish_flight(flight_key, entry)
+                        flight_key = None
+                    await self.cache.put(entry)
+                return response
                 
         except asyncio.TimeoutError:
             logger.error(f"Timeout while proxying to {target_url}")
+            if response is not None and response.prepared:
+                # 响应头已发出，只能中断连接
+                raise
             return aiohttp.web.json_response(
                 {'error': 'Request timeout'}, status=504
             )
+        except RequestTooLarge:
+            # aiohttp 3.8 不包装请求体生成器抛出的异常
+            return self.request_too_large(target_url)
         except aiohttp.ClientError as e:
+            if request.get('body_too_large'):
+                return self.request_too_large(target_url)
+            if isinstance(e, ConnectionResetError) and response is not None and response.prepared:
+                # 新版 aiohttp 把写浏览器失败包装成 ClientConnectionResetError
+                flight_entry = FLIGHT_ABANDONED
+                return self.client_disconnected(request, response, target_url)
             logger.error(f"Client error: {e}")
+            if response is not None and response.prepared:
+                raise
             return aiohttp.web.json_response(
                 {'error': f'Proxy error: {str(e)}'}, status=502
             )
+        except ConnectionResetError:
+            # 浏览器在传输过程中断开连接
+            flight_entry = FLIGHT_ABANDONED
+            return self.client_disconnected(request, response, target_url)
+        except asyncio.CancelledError:
+            flight_entry = FLIGHT_ABANDONED
+            raise
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
+            if response is not None and response.prepared:
+                raise
             return aiohttp.web.json_response(
                 {'error': f'Internal server error: {str(e)}'}, status=500
             )
+        finally:
+            if flight_key is not None:
+                # 无论成功、出错还是浏览器断开，都要唤醒等待同一回源的请求
+                self.cache.finish_flight(flight_key, flight_entry)
+    
+    def is_websocket_upgrade(self, request: aiohttp.web.Request) -> bool:
+        """判断是否为 WebSocket 握手请求"""
+        return request.headers.get('Upgrade', '').lower() == 'websocket' and \
+            'upgrade' in request.headers.get('Connection', '').lower()
+    
+    @staticmethod
+    def relay_close_code(ws) -> int:
+        """把一端的关闭码转给另一端；异常断开时告诉对端网关出错"""
+        code = ws.close_code
+        if code == 1005:
+            # 对端发送了不带状态码的关闭帧，视为正常关闭
+            return aiohttp.WSCloseCode.OK
+        if code is None or code in _RESERVED_CLOSE_CODES or not 1000 <= code <= 4999:
+            return aiohttp.WSCloseCode.BAD_GATEWAY
+        return code
+    
+    async def relay_websocket(self, source, target, inbound: bool):
+        """
+        把 source 收到的帧逐个发给 target，发送完成后才读取下一帧，
+        对端处理不过来时不再从 source 读取，由 TCP 流控把压力传回发送方
+        ping/pong 由两端的 aiohttp 各自应答，不需要中继
+        """
+        close_code = None
+        async for msg in source:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                await target.send_str(msg.data)
+                size = len(msg.data.encode('utf-8'))
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                await target.send_bytes(msg.data)
+                size = len(msg.data)
+            else:
+                # ERROR：帧超过 max_frame_size 或协议错误，aiohttp 已经关闭了 source；
+                # 超长时对端同样以 1009 关闭，而不是笼统的网关错误
+                if getattr(msg.data, 'code', None) == aiohttp.WSCloseCode.MESSAGE_TOO_BIG:
+                    close_code = aiohttp.WSCloseCode.MESSAGE_TOO_BIG
+                break
+            self.metrics.websocket_messages += 1
+            if inbound:
+                self.metrics.bytes_in += size
+            else:
+                self.metrics.bytes_out += size
+        await target.close(code=close_code or self.relay_close_code(source))
+    
+    async def proxy_websocket(self, request: aiohttp.web.Request) -> aiohttp.web.StreamResponse:
+        """先连接上游 WebSocket，成功后再接受浏览器的握手，然后双向转发帧"""
+        target_url = self.get_target_url(request)
+        if not target_url:
+            return aiohttp.web.json_response({'error': 'URL parameter required'}, status=400)
+        if not self.is_domain_allowed(target_url):
+            return aiohttp.web.json_response({'error': 'Domain not allowed'}, status=403)
+        logger.info("Proxying WebSocket to: %s", target_url)
+        
+        headers = CIMultiDict(
+            (name, value) for name, value in request.headers.items()
+            if name.lower() not in WEBSOCKET_SKIP_HEADERS
+        )
+        protocols = [
+            protocol.strip() for protocol in request.headers.get('Sec-WebSocket-Protocol', '').split(',')
+            if protocol.strip()
+        ]
+        try:
+            upstream = await asyncio.wait_for(
+                self.session.ws_connect(
+                    target_url,
+                    headers=headers,
+                    protocols=protocols,
+                    heartbeat=self.websocket_heartbeat,
+                    max_msg_size=self.websocket_max_frame_size,
+                ),
+                self.websocket_connect_timeout
+            )
+        except aiohttp.WSServerHandshakeError as e:
+            logger.warning("Upstream rejected WebSocket handshake to %s: %s", target_url, e.status)
+            status = e.status if 400 <= e.status < 500 else 502
+            return aiohttp.web.json_response({'error': f'Upstream rejected WebSocket: {e.message}'}, status=status)
+        except asyncio.TimeoutError:
+            logger.error("Timeout while connecting WebSocket to %s", target_url)
+            return aiohttp.web.json_response({'error': 'Request timeout'}, status=504)
+        except aiohttp.ClientError as e:
+            logger.error("WebSocket client error: %s", e)
+            return aiohttp.web.json_response({'error': f'Proxy error: {str(e)}'}, status=502)
+        
+        browser = aiohttp.web.WebSocketResponse(
+            protocols=(upstream.protocol,) if upstream.protocol else (),
+            heartbeat=self.websocket_heartbeat,
+            max_msg_size=self.websocket_max_frame_size,
+        )
+        try:
+            await browser.prepare(request)
+            self.websockets.add(browser)
+            self.metrics.active_websockets += 1
+            relays = {
+                asyncio.ensure_future(self.relay_websocket(browser, upstream, inbound=True)),
+                asyncio.ensure_future(self.relay_websocket(upstream, browser, inbound=False)),
+            }
+            try:
+                # 任一方向结束（一端关闭或出错）后另一方向也随之结束
+                await asyncio.wait(relays, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in relays:
+                    task.cancel()
+                await asyncio.gather(*relays, return_exceptions=True)
+        finally:
+            if browser in self.websockets:
+                self.websockets.discard(browser)
+                self.metrics.active_websockets -= 1
+            await upstream.close()
+            if browser.prepared and not browser.closed:
+                await browser.close(code=self.relay_close_code(upstream))
+        logger.info("WebSocket to %s closed (browser %s, upstream %s)",
+                    target_url, browser.close_code, upstream.close_code)
+        return browser
+    
+    async def close_websockets(self, app: aiohttp.web.Application):
+        """服务器关闭时主动关闭仍在中继的 WebSocket，不等到关闭超时"""
+        for ws in list(self.websockets):
+            await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Server shutdown')
     
     async def handle_proxy_get(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
-        """处理GET代理请求"""
+        """处理GET代理请求（包括 WebSocket 握手）"""
+        if self.websocket_enabled and self.is_websocket_upgrade(request):
+            return await self.proxy_websocket(request)
         return await self.proxy_request(request, 'GET')
     
+    async def handle_proxy_head(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        """处理HEAD代理请求"""
+        return await self.proxy_request(request, 'HEAD')
+    
     async def handle_proxy_post(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         """处理POST代理请求"""
         return await self.proxy_request(request, 'POST')
@@ -205,20 +1077,46 @@ class CORSProxyServer:
         """处理PUT代理请求"""
         return await self.proxy_request(request, 'PUT')
     
+    async def handle_proxy_patch(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        """处理PATCH代理请求"""
+        return await self.proxy_request(request, 'PATCH')
+    
     async def handle_proxy_delete(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         """处理DELETE代理请求"""
         return await self.proxy_request(request, 'DELETE')
     
-    async def start(self):
-        """启动服务器"""
+    async def startup(self):
+        """创建上游会话并开始监听，不阻塞（便于与其他服务共用事件循环）"""
         await self.create_session()
-        runner = aiohttp.web.AppRunner(self.app)
-        await runner.setup()
+        runner_options = {'keepalive_timeout': self.client_keepalive_timeout,
+                          'access_log_class': PathAccessLogger}
+        if not self.access_log:
+            # 每个请求一行访问日志在高并发下开销明显，可以在配置中关闭
+            runner_options['access_log'] = None
+        self._runner = aiohttp.web.AppRunner(self.app, **runner_options)
+        await self._runner.setup()
         
-        site = aiohttp.web.TCPSite(runner, self.host, self.port)
+        site = aiohttp.web.TCPSite(
+            self._runner, self.host, self.port,
+            shutdown_timeout=self.SHUTDOWN_TIMEOUT,
+            reuse_port=self.reuse_port or None
+        )
         await site.start()
         
+        self._watcher = asyncio.create_task(self.watch_config()) if self.config_path else None
         logger.info(f"CORS Proxy Server started at http://{self.host}:{self.port}")
+    
+    async def shutdown(self):
+        """停止监听并关闭上游会话"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+        await self.close_session()
+    
+    async def start(self):
+        """启动服务器"""
+        await self.startup()
         logger.info("Press Ctrl+C to stop the server")
         
         try:
@@ -227,28 +1125,198 @@ class CORSProxyServer:
         except KeyboardInterrupt:
             logger.info("Shutting down server...")
         finally:
-            await runner.cleanup()
-            await self.close_session()
+            await self.shutdown()
 
-async def main():
-    """主函数"""
+def configure_logging(config: dict, debug: bool = False, worker_index: Optional[int] = None,
+                      console: bool = True):
+    """
+    按 config.json 的 logging 段配置日志：设置了 logging.file 时写入该文件并按 max_bytes / backup_count 轮转，
+    console 为 True 时同时输出到终端（未设置文件时总是输出到终端）。
+    logging.async 开启时由后台线程批量写出，返回写入线程（退出前调用 stop()），否则返回 None
+    :param worker_index: 多进程模式下的 worker 序号，每个 worker 写自己的文件（cors_proxy.worker0.log），
+                         避免多个进程同时轮转同一个文件
+    """
+    log_config = config.get('logging', {})
+    filename = log_config.get('file')
+    if filename and worker_index is not None:
+        root, ext = os.path.splitext(filename)
+        filename = f"{root}.worker{worker_index}{ext}"
+    
+    writer = None
+    if log_config.get('async', False):
+        writer = setup_async_logging(log_config, filename=filename,
+                                     stream=sys.stderr if console or not filename else None,
+                                     parse_size=parse_size)
+    elif filename:
+        handler = logging.handlers.RotatingFileHandler(
+            filename,
+            maxBytes=parse_size(log_config.get('max_bytes', 0)),
+            backupCount=log_config.get('backup_count', 5),
+            encoding='utf-8'
+        )
+        handlers = [handler]
+        if console:
+            handlers.append(logging.StreamHandler(sys.stderr))
+        formatter = logging.Formatter(
+            log_config.get('format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        )
+        root_logger = logging.getLogger()
+        for existing in list(root_logger.handlers):
+            root_logger.removeHandler(existing)
+        sampling = log_config.get('sampling')
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            if sampling:
+                handler.addFilter(SamplingFilter(sampling))
+            root_logger.addHandler(handler)
+        root_logger.setLevel(getattr(logging, log_config.get('level', 'INFO').upper()))
+    if debug:
+        logging.getLogger().setLevel(logging.DEBUG)
+    return writer
+
+def parse_args():
     import argparse
     
     parser = argparse.ArgumentParser(description='CORS Proxy Server')
     parser.add_argument('--host', default='127.0.0.1', help='Server host')
     parser.add_argument('--port', type=int, default=8080, help='Server port')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, help='Config file path')
+    parser.add_argument('--loop', choices=('auto', 'uvloop', 'asyncio'),
+                        help='Event loop implementation (default: performance.event_loop in config)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes sharing the port via SO_REUSEPORT')
+    parser.add_argument('--standby', action='store_true',
+                        help='Load everything, then wait for a line on stdin before binding the port')
+    return parser.parse_args()
+
+async def main(args=None):
+    """主函数"""
+    if args is None:
+        args = parse_args()
     
-    args = parser.parse_args()
+    config = load_config(args.config)
+    log_writer = configure_logging(config, args.debug)
+    try:
+        server = CORSProxyServer(host=args.host, port=args.port, config=config, config_path=args.config)
+        
+        if args.standby:
+            # 热备进程：导入和初始化已完成，等待 supervisor 通知后再监听端口
+            line = await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            # 等待期间上一个进程仍在写缓存目录，启动时建立的磁盘索引已经过时
+            if server.cache is not None:
+                server.cache.reload_disk_index()
+        await server.start()
+    finally:
+        if log_writer is not None:
+            log_writer.stop()
+
+async def serve_worker(args, shared_state: dict, index: int):
+    """单个 worker 的事件循环：收到 SIGTERM/SIGINT 后停止接受新连接，等在途请求完成后退出"""
+    config = load_config(args.config)
+    log_writer = configure_logging(config, args.debug, worker_index=index)
+    try:
+        server = CORSProxyServer(host=args.host, port=args.port, config=config,
+                                 config_path=args.config, shared_state=shared_state)
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        
+        await server.startup()
+        await stop.wait()
+        logger.info(f"Worker {os.getpid()} draining connections...")
+        await server.shutdown()
+    finally:
+        if log_writer is not None:
+            log_writer.stop()
+
+def select_event_loop(args) -> str:
+    """命令行 --loop 优先，其次是配置文件的 performance.event_loop"""
+    mode = args.loop or load_config(args.config).get('performance', {}).get('event_loop', 'asyncio')
+    loop_name = install_event_loop(mode)
+    logger.info(f"Using {loop_name} event loop")
+    return loop_name
+
+def run_worker(args, shared_state: dict, index: int):
+    """worker 进程入口"""
+    # fork 出来的子进程继承了主进程的信号处理函数，先恢复默认，事件循环启动后再接管
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    select_event_loop(args)
+    asyncio.run(serve_worker(args, shared_state, index))
+
+def run_workers(args):
+    """
+    多进程模式：启动 args.workers 个 worker 共用同一个端口（SO_REUSEPORT，由内核分配连接），
+    主进程只负责拉起、重启和协调停止 worker
+    """
+    import multiprocessing
     
-    if args.debug:
-        logging.getLogger().setLevel(logging.DEBUG)
+    config = load_config(args.config)
+    rate_limit_config = config.get('security', {}).get('rate_limit', {})
+    shared_state = {'rate_limit': RateLimiter.create_shared_state(rate_limit_config)}
+    
+    if args.standby:
+        if not sys.stdin.readline():
+            return
+    
+    workers: List[multiprocessing.Process] = []
+    
+    def spawn(index: int):
+        process = multiprocessing.Process(target=run_worker, args=(args, shared_state, index))
+        process.start()
+        return process
     
-    server = CORSProxyServer(host=args.host, port=args.port)
-    await server.start()
+    stopping = False
+    
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    for index in range(args.workers):
+        workers.append(spawn(index))
+    logger.info(f"Started {args.workers} workers on http://{args.host}:{args.port} "
+                f"(pids: {', '.join(str(p.pid) for p in workers)})")
+    
+    try:
+        while not stopping:
+            time.sleep(1)
+            for index, process in enumerate(workers):
+                if not process.is_alive() and not stopping:
+                    logger.warning(f"Worker {process.pid} exited with code {process.exitcode}, restarting")
+                    workers[index] = spawn(index)
+    finally:
+        logger.info("Shutting down workers...")
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + CORSProxyServer.SHUTDOWN_TIMEOUT + 5
+        for process in workers:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not stop in time, killing")
+                process.kill()
+                process.join()
+        logger.info("All workers stopped")
 
 if __name__ == '__main__':
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        print("\nServer stopped by user")
\ No newline at end of file
+    args = parse_args()
+    if args.workers > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+        logger.warning("SO_REUSEPORT is not supported on this platform, falling back to a single worker")
+        args.workers = 1
+    
+    if args.workers > 1:
+        run_workers(args)
+    else:
+        select_event_loop(args)
+        try:
+            asyncio.run(main(args))
+        except KeyboardInterrupt:
+            print("\nServer stopped by user")
@@ -79,11 +79,10 @@
         });
     }
     
-    // 检查本地代理是否可用（测试代理功能）
+    // 检查本地代理是否可用（请求代理的就绪检查接口，不再下载整个 SDK）
     function checkLocalProxyAvailability() {
         return new Promise((resolve, reject) => {
-            const testUrl = CONFIG.LOCAL_PROXY_URL + (CONFIG.LOCAL_PROXY_URL.endsWith('/') ? '' : '/') +
-                           encodeURIComponent('https://lf-cdn.coze.cn/obj/unpkg/flow-platform/chat-app-sdk/1.2.0-beta.10/libs/cn/index.js');
+            const testUrl = CONFIG.LOCAL_PROXY_URL + (CONFIG.LOCAL_PROXY_URL.endsWith('/') ? '' : '/') + '__ready';
             
             if (typeof GM_xmlhttpRequest === 'function') {
                 GM_xmlhttpRequest({
@@ -91,7 +90,7 @@
                     url: testUrl,
                     timeout: CONFIG.PROXY_CHECK_TIMEOUT,
                     onload: function(response) {
-                        // 检查代理是否真正工作（返回200状态码）
+                        // 代理已就绪时返回200，上游连接池未就绪时返回503
                         const isAvailable = response.status === 200;
                         resolve(isAvailable);
                     },
@@ -107,10 +106,10 @@
                 fetch(testUrl, {
                     method: 'GET',
                     mode: 'cors',
+                    cache: 'no-store',
                     signal: AbortSignal.timeout(CONFIG.PROXY_CHECK_TIMEOUT)
                 })
-                .then(response => response.text())
-                .then(text => resolve(response.ok))
+                .then(response => resolve(response.ok))
                 .catch(() => resolve(false));
             }
         });
@@ -579,20 +578,21 @@
         log('🔍 检查JWT服务器连接性...', 'info');
         
         try {
-            // 首先检查服务器主页是否可访问
-            const response = await fetch('http://127.0.0.1:8081/', {
+            // 请求就绪检查接口（只返回一小段 JSON，不再加载整个主页）
+            const response = await fetch('http://127.0.0.1:8081/__ready', {
                 method: 'GET',
                 headers: {
-                    'Accept': 'text/html'
+                    'Accept': 'application/json'
                 },
                 credentials: 'omit',
+                cache: 'no-store',
                 signal: AbortSignal.timeout(3000)
             });
 
             if (response.ok) {
-                log('✅ JWT服务器主页访问正常', 'success');
-                log(`📋 服务器状态码: ${response.status}`, 'debug');
-                log(`📋 Content-Type: ${response.headers.get('Content-Type') || 'N/A'}`, 'debug');
+                const readiness = await response.json();
+                log('✅ JWT服务器已就绪', 'success');
+                log(`📋 token缓存: ${JSON.stringify(readiness.token_cache || {})}`, 'debug');
                 return true;
             } else {
                 log(`❌ JWT服务器返回状态码: ${response.status}`, 'error');
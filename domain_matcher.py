@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+CORS 代理服务器的域名白名单/黑名单匹配器
+启动时把 allowed_domains / blocked_domains 编译成主机名后缀树和 IP 前缀表，
+每次查询只与主机名的标签数有关，与规则数量无关
+"""
+
+import ipaddress
+from typing import Dict, Iterable, List, Optional
+
+ALLOW = 'allow'
+BLOCK = 'block'
+
+
+class _TrieNode:
+    __slots__ = ('children', 'exact', 'wildcard')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        # 精确匹配本节点对应的域名时的结果
+        self.exact: Optional[str] = None
+        # 匹配本节点下任意子域名（*.example.com）时的结果
+        self.wildcard: Optional[str] = None
+
+
+class DomainMatcher:
+    """编译后的域名/IP 规则表"""
+
+    def __init__(self, allowed: Iterable[str] = (), blocked: Iterable[str] = ()):
+        self._root = _TrieNode()
+        # IP 版本 -> {前缀长度 -> {网络地址: 结果}}
+        self._networks: Dict[int, Dict[int, Dict[int, str]]] = {4: {}, 6: {}}
+        self.allow_all = True
+
+        for pattern in allowed:
+            self._add(pattern, ALLOW)
+            self.allow_all = False
+        for pattern in blocked:
+            self._add(pattern, BLOCK)
+
+        # 查询时只需遍历实际出现过的前缀长度
+        self._prefix_lengths = {
+            version: sorted(table.keys(), reverse=True)
+            for version, table in self._networks.items()
+        }
+
+    # ------------------------------------------------------------------
+    # 编译
+    # ------------------------------------------------------------------
+
+    def _add(self, pattern: str, action: str):
+        pattern = pattern.strip().lower().rstrip('.')
+        if not pattern:
+            return
+        network = self._parse_network(pattern)
+        if network is not None:
+            table = self._networks[network.version].setdefault(network.prefixlen, {})
+            key = int(network.network_address)
+            if table.get(key) != BLOCK:
+                table[key] = action
+            return
+
+        wildcard = pattern.startswith('*.')
+        if wildcard:
+            pattern = pattern[2:]
+        node = self._root
+        for label in reversed(pattern.split('.')):
+            node = node.children.setdefault(label, _TrieNode())
+        if wildcard:
+            if node.wildcard != BLOCK:
+                node.wildcard = action
+        elif node.exact != BLOCK:
+            node.exact = action
+
+    @staticmethod
+    def _parse_network(pattern: str):
+        """把 '10.*'、'192.168.*'、'10.0.0.0/8'、'127.0.0.1' 转成网络，非 IP 规则返回 None"""
+        if pattern.endswith('.*') and all(part.isdigit() for part in pattern[:-2].split('.')):
+            octets = pattern[:-2].split('.')
+            if len(octets) > 3:
+                return None
+            address = '.'.join(octets + ['0'] * (4 - len(octets)))
+            try:
+                return ipaddress.ip_network(f"{address}/{8 * len(octets)}")
+            except ValueError:
+                return None
+        try:
+            return ipaddress.ip_network(pattern, strict=False)
+        except ValueError:
+            return None
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def match(self, host: str) -> Optional[str]:
+        """返回 'allow' / 'block' / None（没有规则命中）"""
+        host = host.lower().rstrip('.')
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return self._match_hostname(host)
+        return self._match_address(address)
+
+    def _match_hostname(self, host: str) -> Optional[str]:
+        node = self._root
+        result = None
+        labels = host.split('.')
+        for index in range(len(labels) - 1, -1, -1):
+            node = node.children.get(labels[index])
+            if node is None:
+                break
+            # 还有更深的子域名标签时才适用通配规则
+            if index > 0 and node.wildcard is not None:
+                result = node.wildcard
+                if result == BLOCK:
+                    return BLOCK
+            if index == 0 and node.exact is not None:
+                return node.exact
+        return result
+
+    def _match_address(self, address) -> Optional[str]:
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        value = int(address)
+        bits = address.max_prefixlen
+        table = self._networks[address.version]
+        result = None
+        for prefixlen in self._prefix_lengths[address.version]:
+            key = (value >> (bits - prefixlen)) << (bits - prefixlen) if prefixlen else 0
+            action = table[prefixlen].get(key)
+            if action == BLOCK:
+                return BLOCK
+            if action is not None and result is None:
+                result = action
+        return result
+
+    def is_allowed(self, host: Optional[str]) -> bool:
+        """黑名单优先；配置了白名单时只放行白名单内的主机"""
+        if not host:
+            return False
+        action = self.match(host)
+        if action == BLOCK:
+            return False
+        return action == ALLOW or self.allow_all
+
+    @classmethod
+    def from_config(cls, security_config: dict, default_allowed: List[str]) -> 'DomainMatcher':
+        return cls(
+            allowed=security_config.get('allowed_domains', default_allowed),
+            blocked=security_config.get('blocked_domains', []),
+        )
@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+"""
+CORS 代理服务器的 HTTP 响应缓存
+内存 LRU + 磁盘两级缓存，按 RFC 7234 处理 Cache-Control / ETag / Last-Modified
+"""
+
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from proxy_encoding import accepts_encoding, decoding_supported
+
+logger = logging.getLogger('cors-proxy.cache')
+
+# 可以缓存的响应状态码
+CACHEABLE_STATUS = frozenset({200, 203, 300, 301, 308, 410})
+
+# 没有显式过期时间时，启发式新鲜度的上限（秒）
+MAX_HEURISTIC_LIFETIME = 24 * 3600
+
+# 代表回源的请求被浏览器取消或断开时的回源结果，等待者重新选出一个请求回源
+FLIGHT_ABANDONED = object()
+
+# 响应不可缓存的 flight key 在这段时间内不再合并（秒），避免等待者每次都多等一次首字节
+UNCOLLAPSIBLE_TTL = 60
+MAX_UNCOLLAPSIBLE_KEYS = 1024
+
+# 共享缓存目录时，本进程每写入 disk_size 的这一比例就按目录实际占用检查一次上限
+SHARED_SWEEP_FRACTION = 16
+
+# 304 响应需要携带的头部（RFC 7232 4.1）
+NOT_MODIFIED_HEADERS = ('Cache-Control', 'Content-Location', 'Date', 'ETag', 'Expires',
+                        'Last-Modified', 'Vary')
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """解析 Cache-Control 头，返回 {指令: 参数}"""
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '=' in part:
+            name, _, arg = part.partition('=')
+            directives[name.strip().lower()] = arg.strip().strip('"')
+        else:
+            directives[part.lower()] = None
+    return directives
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    """解析 HTTP 日期，失败时返回 None"""
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def _weak_etag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def _int_or_none(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CacheEntry:
+    """一条缓存的响应"""
+
+    def __init__(self, key: str, url: str, status: int, headers: List[Tuple[str, str]],
+                 body: Optional[bytes], stored_at: float, lifetime: float,
+                 vary: Dict[str, str], size: int):
+        self.key = key
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+        self.lifetime = lifetime
+        self.vary = vary
+        self.size = size
+
+    def header(self, name: str) -> Optional[str]:
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.header('ETag')
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.header('Last-Modified')
+
+    @property
+    def content_encoding(self) -> str:
+        return self.header('Content-Encoding') or ''
+
+    @property
+    def has_validators(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+    def age(self, now: Optional[float] = None) -> float:
+        return max(0.0, (now or time.time()) - self.stored_at)
+
+    def is_fresh(self, now: Optional[float] = None, max_age: Optional[int] = None) -> bool:
+        age = self.age(now)
+        if max_age is not None and age > max_age:
+            return False
+        return age < self.lifetime
+
+    def matches(self, request_headers) -> bool:
+        """检查请求在 Vary 指定的头上是否与缓存时一致"""
+        for name, value in self.vary.items():
+            if name.lower() == 'accept-encoding':
+                # 编码差异由代理处理：客户端接受缓存的编码，或者代理能把它解码成明文
+                encoding = self.content_encoding
+                if accepts_encoding(request_headers.get(name), encoding) or decoding_supported(encoding):
+                    continue
+                return False
+            if request_headers.get(name, '') != value:
+                return False
+        return True
+
+    def to_meta(self) -> dict:
+        return {
+            'key': self.key,
+            'url': self.url,
+            'status': self.status,
+            'headers': self.headers,
+            'stored_at': self.stored_at,
+            'lifetime': self.lifetime,
+            'vary': self.vary,
+            'size': self.size,
+        }
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> 'CacheEntry':
+        return cls(
+            key=meta['key'], url=meta['url'], status=meta['status'],
+            headers=[tuple(h) for h in meta['headers']], body=None,
+            stored_at=meta['stored_at'], lifetime=meta['lifetime'],
+            vary=meta.get('vary', {}), size=meta['size'],
+        )
+
+
+class ResponseCache:
+    """内存 LRU + 磁盘两级响应缓存"""
+
+    def __init__(self, memory_size: int, disk_size: int, directory: Optional[str],
+                 max_object_size: int, shared: bool = False):
+        """
+        :param shared: 多个 worker 进程共用同一个缓存目录，此时以目录本身作为共享索引，
+                       本进程索引中没有的条目会再到磁盘上查找；disk_size 按目录中实际的文件
+                       大小执行（定期扫描，两次扫描之间最多超出 workers × disk_size / 16）
+        """
+        self.memory_size = memory_size
+        self.disk_size = disk_size if directory else 0
+        self.directory = directory
+        self.max_object_size = max_object_size
+        self.shared = shared
+
+        # key -> CacheEntry（带响应体），按最近使用排序
+        self._memory: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._memory_bytes = 0
+        # key -> CacheEntry（不带响应体，只有元数据），按最近使用排序
+        self._disk: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._disk_bytes = 0
+        # 共享模式下自上次扫描目录以来本进程写入的字节数
+        self._unswept_bytes = 0
+
+        # 合并回源：flight key -> 正在回源的请求完成后得到的缓存条目（Future）
+        self._flights: Dict[str, 'asyncio.Future[Optional[CacheEntry]]'] = {}
+        # flight key -> 到期时间，上次回源得到的响应不可缓存
+        self._uncollapsible: 'OrderedDict[str, float]' = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.collapsed = 0
+
+        if self.directory and self.disk_size > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_disk_index()
+
+    @classmethod
+    def from_config(cls, cache_config: dict, base_dir: str, parse_size,
+                    shared: bool = False) -> Optional['ResponseCache']:
+        """根据 config.json 的 cache 段创建缓存，未启用时返回 None"""
+        if not cache_config.get('enabled', False):
+            return None
+        directory = cache_config.get('directory')
+        if directory and not os.path.isabs(directory):
+            directory = os.path.join(base_dir, directory)
+        return cls(
+            memory_size=parse_size(cache_config.get('memory_size', '64MB')),
+            disk_size=parse_size(cache_config.get('disk_size', '512MB')),
+            directory=directory,
+            max_object_size=parse_size(cache_config.get('max_object_size', '16MB')),
+            shared=shared,
+        )
+
+    # ------------------------------------------------------------------
+    # 缓存策略
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_key(method: str, url: str) -> str:
+        return f"{method} {url}"
+
+    @staticmethod
+    def request_allows_cache(request_headers) -> bool:
+        """请求本身是否允许使用/写入缓存"""
+        directives = parse_cache_control(request_headers.get('Cache-Control'))
+        return 'no-store' not in directives
+
+    @staticmethod
+    def request_requires_revalidation(request_headers) -> bool:
+        """请求是否要求跳过新鲜度检查、强制回源验证"""
+        directives = parse_cache_control(request_headers.get('Cache-Control'))
+        if 'no-cache' in directives:
+            return True
+        if 'cache-control' not in request_headers and \
+                request_headers.get('Pragma', '').lower() == 'no-cache':
+            return True
+        return _int_or_none(directives.get('max-age')) == 0
+
+    def is_cacheable(self, status: int, request_headers, response_headers) -> bool:
+        """判断上游响应是否可以存入共享缓存"""
+        if status not in CACHEABLE_STATUS:
+            return False
+        directives = parse_cache_control(response_headers.get('Cache-Control'))
+        if 'no-store' in directives or 'private' in directives:
+            return False
+        if response_headers.get('Vary', '').strip() == '*':
+            return False
+        if 'Authorization' in request_headers and \
+                not ({'public', 's-maxage', 'must-revalidate'} & directives.keys()):
+            return False
+        content_length = _int_or_none(response_headers.get('Content-Length'))
+        if content_length is not None and content_length > self.max_object_size:
+            return False
+        # 没有过期信息也没有验证器的响应缓存了也无法复用
+        return self.freshness_lifetime(response_headers) > 0 or \
+            'ETag' in response_headers or 'Last-Modified' in response_headers
+
+    @staticmethod
+    def freshness_lifetime(response_headers, now: Optional[float] = None) -> float:
+        """计算响应的新鲜度寿命（秒）"""
+        directives = parse_cache_control(response_headers.get('Cache-Control'))
+        if 'no-cache' in directives:
+            return 0
+        for name in ('s-maxage', 'max-age'):
+            seconds = _int_or_none(directives.get(name))
+            if seconds is not None:
+                return max(0, seconds)
+
+        date = parse_http_date(response_headers.get('Date')) or now or time.time()
+        expires = response_headers.get('Expires')
+        if expires is not None:
+            expires_at = parse_http_date(expires)
+            return max(0.0, expires_at - date) if expires_at else 0
+
+        # 启发式新鲜度：Last-Modified 到现在时间间隔的 10%
+        last_modified = parse_http_date(response_headers.get('Last-Modified'))
+        if last_modified is not None:
+            return min(MAX_HEURISTIC_LIFETIME, max(0.0, (date - last_modified) / 10))
+        return 0
+
+    def build_entry(self, method: str, url: str, status: int, request_headers,
+                    response_headers: List[Tuple[str, str]], body: bytes,
+                    response_time: Optional[float] = None) -> CacheEntry:
+        now = response_time or time.time()
+        header_map = _HeaderView(response_headers)
+        vary = {}
+        for name in header_map.get('Vary', '').split(','):
+            name = name.strip()
+            if name:
+                vary[name] = request_headers.get(name, '')
+        initial_age = _int_or_none(header_map.get('Age')) or 0
+        return CacheEntry(
+            key=self.make_key(method, url), url=url, status=status,
+            headers=list(response_headers), body=body,
+            stored_at=now - initial_age,
+            lifetime=self.freshness_lifetime(header_map, now),
+            vary=vary, size=len(body),
+        )
+
+    @staticmethod
+    def not_modified(entry: CacheEntry, request_headers) -> bool:
+        """按 RFC 7232 判断客户端的条件请求能否直接用 304 回答"""
+        if_none_match = request_headers.get('If-None-Match')
+        if if_none_match is not None:
+            # If-None-Match 优先于 If-Modified-Since，使用弱比较
+            if entry.etag is None:
+                return False
+            if if_none_match.strip() == '*':
+                return True
+            return _weak_etag(entry.etag) in {_weak_etag(tag) for tag in if_none_match.split(',')}
+        if_modified_since = parse_http_date(request_headers.get('If-Modified-Since'))
+        last_modified = parse_http_date(entry.last_modified)
+        if if_modified_since is None or last_modified is None:
+            return False
+        return last_modified <= if_modified_since
+
+    def conditional_headers(self, entry: CacheEntry) -> Dict[str, str]:
+        """生成回源验证用的条件请求头"""
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+
+    async def get(self, method: str, url: str, request_headers) -> Optional[CacheEntry]:
+        """查找缓存条目（不论是否新鲜），未命中时返回 None"""
+        key = self.make_key(method, url)
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        else:
+            loop = asyncio.get_running_loop()
+            meta = self._disk.get(key)
+            if meta is None and self.shared and self.disk_size > 0:
+                # 可能是其他 worker 写入的条目
+                meta = await loop.run_in_executor(None, self._read_meta, key)
+                if meta is not None:
+                    self._store_disk_index(meta)
+            if meta is None:
+                return None
+            self._disk.move_to_end(key)
+            body = await loop.run_in_executor(None, self._read_body, key)
+            if body is None:
+                self._drop_disk(key)
+                return None
+            entry = CacheEntry.from_meta(meta.to_meta())
+            entry.body = body
+            self._store_memory(entry)
+
+        if not entry.matches(request_headers):
+            return None
+        return entry
+
+    async def put(self, entry: CacheEntry):
+        """写入缓存：内存直接写入，磁盘写入放到线程池中执行"""
+        if entry.size > self.max_object_size:
+            return
+        self._store_memory(entry)
+        if self.disk_size > 0 and entry.size <= self.disk_size:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self._write_disk, entry)
+            except OSError as e:
+                logger.warning(f"Failed to write cache entry for {entry.url}: {e}")
+                return
+            self._store_disk_index(entry)
+            if self.shared:
+                self._unswept_bytes += entry.size
+                if self._unswept_bytes >= self.disk_size // SHARED_SWEEP_FRACTION:
+                    self._unswept_bytes = 0
+                    removed = await loop.run_in_executor(None, self._sweep_disk)
+                    self._forget_disk(removed)
+
+    async def refresh(self, entry: CacheEntry, response_headers, response_time: Optional[float] = None):
+        """收到 304 后用新的响应头刷新缓存条目的新鲜度"""
+        now = response_time or time.time()
+        updated = OrderedDict((name.lower(), (name, value)) for name, value in entry.headers)
+        for name, value in response_headers.items():
+            if name.lower() in ('content-length', 'content-encoding', 'transfer-encoding'):
+                continue
+            updated[name.lower()] = (name, value)
+        entry.headers = list(updated.values())
+        header_map = _HeaderView(entry.headers)
+        entry.stored_at = now - (_int_or_none(header_map.get('Age')) or 0)
+        entry.lifetime = self.freshness_lifetime(header_map, now)
+        self.revalidations += 1
+        await self.put(entry)
+
+    def invalidate(self, url: str):
+        """不安全方法成功后使对应 URL 的缓存失效"""
+        key = self.make_key('GET', url)
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size
+        if key in self._disk:
+            self._drop_disk(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'collapsed': self.collapsed,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_bytes,
+        }
+
+    # ------------------------------------------------------------------
+    # 合并回源：同一时刻相同的可缓存 GET 只回源一次
+    # ------------------------------------------------------------------
+
+    def flight_key(self, url: str, request_headers, entry: Optional[CacheEntry] = None) -> str:
+        """
+        合并回源的 key：方法 + URL，已知 Vary 时再加上这些请求头的值
+        （Accept-Encoding 除外，编码差异由代理转换）
+        """
+        key = self.make_key('GET', url)
+        if entry is not None:
+            for name in sorted(entry.vary):
+                if name.lower() != 'accept-encoding':
+                    key += f"\n{name.lower()}: {request_headers.get(name, '')}"
+        return key
+
+    def get_flight(self, key: str) -> Optional['asyncio.Future[Optional[CacheEntry]]']:
+        """相同请求正在回源时返回它的结果 Future（等待的请求数由调用方计入 collapsed）"""
+        return self._flights.get(key)
+
+    def collapsible(self, key: str) -> bool:
+        """最近一次回源结果不可缓存的 key 不再合并，直接各自回源"""
+        expires = self._uncollapsible.get(key)
+        if expires is None:
+            return True
+        if expires <= time.monotonic():
+            del self._uncollapsible[key]
+            return True
+        return False
+
+    def start_flight(self, key: str):
+        """登记本请求代表 key 回源，结束时必须调用 finish_flight"""
+        self._flights[key] = asyncio.get_running_loop().create_future()
+
+    def finish_flight(self, key: str, entry: Optional[CacheEntry], uncacheable: bool = False):
+        """
+        回源结束（包括失败和被取消），唤醒等待者：
+        entry 为缓存条目时共用；为 None（出错或不可共享）时等待者各自回源；为 FLIGHT_ABANDONED 时重新合并
+        uncacheable 表示响应不可缓存，此后 UNCOLLAPSIBLE_TTL 秒内这个 key 不再合并
+        """
+        if uncacheable:
+            self._uncollapsible[key] = time.monotonic() + UNCOLLAPSIBLE_TTL
+            self._uncollapsible.move_to_end(key)
+            while len(self._uncollapsible) > MAX_UNCOLLAPSIBLE_KEYS:
+                self._uncollapsible.popitem(last=False)
+        flight = self._flights.pop(key, None)
+        if flight is not None and not flight.done():
+            flight.set_result(entry)
+
+    @staticmethod
+    async def wait_flight(flight: 'asyncio.Future[Optional[CacheEntry]]') -> Optional[CacheEntry]:
+        # shield：等待者被取消时不能取消共享的 Future
+        return await asyncio.shield(flight)
+
+    # ------------------------------------------------------------------
+    # 内存层
+    # ------------------------------------------------------------------
+
+    def _store_memory(self, entry: CacheEntry):
+        if entry.size > self.memory_size:
+            return
+        old = self._memory.pop(entry.key, None)
+        if old is not None:
+            self._memory_bytes -= old.size
+        self._memory[entry.key] = entry
+        self._memory_bytes += entry.size
+        while self._memory_bytes > self.memory_size and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size
+
+    # ------------------------------------------------------------------
+    # 磁盘层
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, self._digest(key) + suffix)
+
+    def reload_disk_index(self):
+        """丢弃磁盘索引并重新扫描缓存目录（热备进程启用时，目录可能已被上一个进程改写）"""
+        self._disk.clear()
+        self._disk_bytes = 0
+        if self.directory and self.disk_size > 0:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        """启动时扫描缓存目录重建磁盘索引"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.meta'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    entries.append(CacheEntry.from_meta(json.load(f)))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping broken cache metadata {name}: {e}")
+        for entry in sorted(entries, key=lambda e: e.stored_at):
+            self._store_disk_index(entry)
+        if self.shared:
+            self._forget_disk(self._sweep_disk())
+        if entries:
+            logger.info(f"Loaded {len(self._disk)} cached responses from {self.directory}")
+
+    def _store_disk_index(self, entry: CacheEntry):
+        old = self._disk.pop(entry.key, None)
+        if old is not None:
+            self._disk_bytes -= old.size
+        meta = CacheEntry.from_meta(entry.to_meta())
+        self._disk[entry.key] = meta
+        self._disk_bytes += meta.size
+        while self._disk_bytes > self.disk_size and self._disk:
+            key = next(iter(self._disk))
+            self._drop_disk(key)
+
+    def _drop_disk(self, key: str):
+        meta = self._disk.pop(key, None)
+        if meta is not None:
+            self._disk_bytes -= meta.size
+        for suffix in ('.meta', '.body'):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+
+    def _sweep_disk(self) -> List[str]:
+        """
+        共享模式：各 worker 的索引只包含自己见过的条目，按索引淘汰无法限制整个目录，
+        因此按目录中实际的响应体大小执行 disk_size，从最久未使用（mtime）的条目开始删除，
+        返回被删除条目的文件名（不含后缀）
+        """
+        files = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as items:
+                for item in items:
+                    if not item.name.endswith('.body'):
+                        continue
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, item.name[:-len('.body')], stat.st_size))
+                    total += stat.st_size
+        except OSError as e:
+            logger.warning(f"Failed to scan cache directory {self.directory}: {e}")
+            return []
+        removed = []
+        for _, digest, size in sorted(files):
+            if total <= self.disk_size:
+                break
+            for suffix in ('.meta', '.body'):
+                try:
+                    os.remove(os.path.join(self.directory, digest + suffix))
+                except OSError:
+                    pass
+            total -= size
+            removed.append(digest)
+        return removed
+
+    def _forget_disk(self, digests: List[str]):
+        """从本进程索引中移除已被删除的磁盘条目"""
+        if not digests:
+            return
+        digests = set(digests)
+        for key in [key for key in self._disk if self._digest(key) in digests]:
+            meta = self._disk.pop(key)
+            self._disk_bytes -= meta.size
+
+    def _write_disk(self, entry: CacheEntry):
+        body_path = self._path(entry.key, '.body')
+        meta_path = self._path(entry.key, '.meta')
+        # 临时文件带上进程号，避免多个 worker 同时写同一条目时互相覆盖
+        tmp_suffix = f'.{os.getpid()}.tmp'
+        with open(body_path + tmp_suffix, 'wb') as f:
+            f.write(entry.body)
+        os.replace(body_path + tmp_suffix, body_path)
+        with open(meta_path + tmp_suffix, 'w', encoding='utf-8') as f:
+            json.dump(entry.to_meta(), f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+    def _read_meta(self, key: str) -> Optional[CacheEntry]:
+        try:
+            with open(self._path(key, '.meta'), 'r', encoding='utf-8') as f:
+                return CacheEntry.from_meta(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _read_body(self, key: str) -> Optional[bytes]:
+        path = self._path(key, '.body')
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        if self.shared:
+            # mtime 作为共享目录中的最近使用时间，供 _sweep_disk 淘汰
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return body
+
+
+class _HeaderView:
+    """对 (name, value) 列表提供大小写不敏感的 get，供新鲜度计算复用"""
+
+    def __init__(self, headers: List[Tuple[str, str]]):
+        self._headers = {}
+        for name, value in headers:
+            self._headers.setdefault(name.lower(), value)
+
+    def get(self, name: str, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._headers
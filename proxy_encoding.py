@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+CORS 代理服务器的内容编码处理
+上游压缩过的响应体默认原样转发给浏览器；只有客户端不接受上游使用的编码时，
+才用流式解码器逐块转成明文（br 需要 brotli/brotlicffi，zstd 需要 zstandard，均为可选依赖）
+"""
+
+import zlib
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 编码别名（RFC 9110 8.4.1）
+_ALIASES = {'x-gzip': 'gzip', 'x-compress': 'compress'}
+
+
+def normalize_encoding(value: Optional[str]) -> str:
+    """规范化 Content-Encoding，未编码时返回空字符串"""
+    encoding = (value or '').strip().lower()
+    if encoding == 'identity':
+        return ''
+    return _ALIASES.get(encoding, encoding)
+
+
+def parse_accept_encoding(value: Optional[str]) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {编码: q 值}"""
+    accepted: Dict[str, float] = {}
+    if not value:
+        return accepted
+    for part in value.split(','):
+        name, _, params = part.partition(';')
+        name = normalize_encoding(name) or 'identity'
+        quality = 1.0
+        params = params.strip()
+        if params.lower().startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """客户端的 Accept-Encoding 是否接受该编码（未编码的响应总是可以发送）"""
+    encoding = normalize_encoding(encoding)
+    if not encoding:
+        return True
+    accepted = parse_accept_encoding(accept_encoding)
+    if encoding in accepted:
+        return accepted[encoding] > 0
+    return accepted.get('*', 0) > 0
+
+
+class StreamDecoder:
+    """逐块解码压缩的响应体，decompress() 可能返回空字节串，结束时调用 flush()"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._decoder = None
+        if encoding == 'gzip':
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'br':
+            self._decoder = brotli.Decompressor()
+        elif encoding == 'zstd':
+            self._decoder = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._decoder is None:
+            # deflate 有 zlib 包装和裸 deflate 两种写法，根据第一个字节判断
+            wbits = zlib.MAX_WBITS if chunk[:1] and chunk[0] & 0x0F == 8 else -zlib.MAX_WBITS
+            self._decoder = zlib.decompressobj(wbits)
+        if self.encoding == 'br' and hasattr(self._decoder, 'process'):
+            return self._decoder.process(chunk)
+        return self._decoder.decompress(chunk)
+
+    def flush(self) -> bytes:
+        # brotli 和 zstd 的解码器不保留未输出的数据
+        if self._decoder is not None and self.encoding in ('gzip', 'deflate'):
+            return self._decoder.flush()
+        return b''
+
+
+def decoding_supported(encoding: str) -> bool:
+    """代理能否把该编码转成明文"""
+    encoding = normalize_encoding(encoding)
+    if encoding in ('', 'gzip', 'deflate'):
+        return True
+    if encoding == 'br':
+        return brotli is not None
+    if encoding == 'zstd':
+        return zstandard is not None
+    return False
+
+
+def create_decoder(encoding: str) -> Optional[StreamDecoder]:
+    """创建流式解码器，不支持的编码（包括多重编码）返回 None"""
+    encoding = normalize_encoding(encoding)
+    if not encoding or not decoding_supported(encoding):
+        return None
+    return StreamDecoder(encoding)
+
+
+def strip_encoding_headers(headers):
+    """解码后的响应头：去掉编码和长度，强 ETag 改为弱 ETag（表示的字节已经不同）"""
+    headers.popall('Content-Encoding', None)
+    headers.popall('Content-Length', None)
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        headers['ETag'] = 'W/' + etag
+
+
+def add_vary(headers, name: str):
+    """确保 Vary 头包含指定的请求头"""
+    current = [item.strip() for item in headers.get('Vary', '').split(',') if item.strip()]
+    if '*' in current or name.lower() in (item.lower() for item in current):
+        return
+    headers['Vary'] = ', '.join(current + [name])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+CORS 代理服务器的 Prometheus 指标
+所有计数都在事件循环线程内更新，只是普通的整数/字典自增，不需要加锁；
+/__metrics 被抓取时才拼接成 Prometheus 文本格式
+另外提供单个请求的阶段耗时记录（Server-Timing 响应头）
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 秒，覆盖从本地缓存命中到长时间 SSE 流的范围
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# 目标主机标签的最大数量，超出后归入 other，防止标签基数无限增长
+MAX_HOSTS = 200
+OTHER_HOST = 'other'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    return ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Histogram:
+    """固定桶直方图，observe 只做一次二分查找和两次加法"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个位置对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum {_number(self.sum)}')
+        lines.append(f'{name}_count {self.count}')
+        return lines
+
+
+class RequestTimings:
+    """
+    单个请求各阶段的耗时，用于 Server-Timing 响应头和结构化日志。
+    mark() 记录从上一次 mark 到现在的时间；add() 记录由 TraceConfig 回调测得的时间段
+    """
+
+    __slots__ = ('started', '_last', 'phases')
+
+    def __init__(self):
+        self.started = self._last = time.perf_counter()
+        # 阶段名 -> 秒，按记录顺序排列
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        now = time.perf_counter()
+        duration = now - self._last
+        self._last = now
+        self.add(phase, duration)
+        return duration
+
+    def add(self, phase: str, duration: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self, include_total: bool = True) -> str:
+        """生成 Server-Timing 头，单位为毫秒"""
+        items = [f'{phase};dur={duration * 1000:.1f}' for phase, duration in self.phases.items()]
+        if include_total:
+            items.append(f'total;dur={self.total() * 1000:.1f}')
+        return ', '.join(items)
+
+    def as_millis(self) -> Dict[str, float]:
+        result = {phase: round(duration * 1000, 2) for phase, duration in self.phases.items()}
+        result['total'] = round(self.total() * 1000, 2)
+        return result
+
+
+class ProxyMetrics:
+    """代理请求计数、延迟直方图和流量统计"""
+
+    REQUEST_LABELS = ('method', 'status', 'host')
+
+    def __init__(self):
+        # (method, status, host) -> 请求数
+        self.requests: Dict[Tuple[str, int, str], int] = {}
+        self._hosts = set()
+        self.upstream_ttfb = Histogram()
+        self.request_duration = Histogram()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.active_requests = 0
+        self.active_websockets = 0
+        self.websocket_messages = 0
+
+    def host_label(self, host: Optional[str]) -> str:
+        if not host:
+            return ''
+        if host in self._hosts:
+            return host
+        if len(self._hosts) >= MAX_HOSTS:
+            return OTHER_HOST
+        self._hosts.add(host)
+        return host
+
+    def record_request(self, method: str, status: int, host: Optional[str], duration: float):
+        key = (method, status, self.host_label(host))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.request_duration.observe(duration)
+
+    def render(self, gauges: Dict[str, Tuple[str, str, float]]) -> str:
+        """
+        生成 Prometheus 文本格式
+        :param gauges: 名称 -> (类型, 说明, 值)，用于连接池、缓存等由其他组件维护的数值
+        """
+        lines = [
+            '# HELP cors_proxy_requests_total Proxied requests by method, status and target host',
+            '# TYPE cors_proxy_requests_total counter',
+        ]
+        for values, count in sorted(self.requests.items()):
+            lines.append(f'cors_proxy_requests_total{{{_labels(self.REQUEST_LABELS, values)}}} {count}')
+
+        lines += [
+            '# HELP cors_proxy_upstream_ttfb_seconds Time from sending the upstream request to receiving its headers',
+            '# TYPE cors_proxy_upstream_ttfb_seconds histogram',
+        ]
+        lines += self.upstream_ttfb.render('cors_proxy_upstream_ttfb_seconds')
+        lines += [
+            '# HELP cors_proxy_request_duration_seconds Total time spent handling a proxied request',
+            '# TYPE cors_proxy_request_duration_seconds histogram',
+        ]
+        lines += self.request_duration.render('cors_proxy_request_duration_seconds')
+
+        builtin = {
+            'cors_proxy_received_bytes_total': ('counter', 'Request body bytes received from clients', self.bytes_in),
+            'cors_proxy_sent_bytes_total': ('counter', 'Response body bytes sent to clients', self.bytes_out),
+            'cors_proxy_active_requests': ('gauge', 'Proxied requests currently in flight', self.active_requests),
+            'cors_proxy_websocket_connections': ('gauge', 'WebSocket sessions currently relayed', self.active_websockets),
+            'cors_proxy_websocket_messages_total': ('counter', 'WebSocket messages relayed in either direction',
+                                                    self.websocket_messages),
+        }
+        for name, (metric_type, description, value) in {**builtin, **gauges}.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
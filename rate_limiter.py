@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+CORS 代理服务器的令牌桶限流器
+每个键（客户端IP或目标主机）只保存令牌数和上次更新时间，长时间空闲的键会被淘汰
+多进程模式下改用共享内存中的固定槽位表，各 worker 共用同一组计数
+"""
+
+import math
+import multiprocessing
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 多进程共享状态的默认槽位数（每个维度一张表）
+DEFAULT_SHARED_SLOTS = 4096
+
+# Retry-After 的上限（秒），避免速率极低时给出过大的等待时间
+MAX_RETRY_AFTER = 3600
+
+
+class TokenBucketLimiter:
+    """按键限流的令牌桶"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else rate_per_minute)
+        # 桶从空到满所需时间，空闲超过这个时间的桶等价于新桶，可以直接删除
+        self.idle_ttl = self.capacity / self.rate if self.rate > 0 else 0
+        # key -> [tokens, last_update]，按最近访问排序
+        self._buckets: 'OrderedDict[str, list]' = OrderedDict()
+
+    def acquire(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """尝试取一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        now = time.monotonic() if now is None else now
+        self._evict_idle(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+        else:
+            tokens, last = bucket
+            bucket[0] = min(self.capacity, tokens + (now - last) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True, 0.0
+        if self.rate <= 0:
+            return False, float('inf')
+        return False, (1 - bucket[0]) / self.rate
+
+    def refund(self, key: str):
+        """归还一个令牌（请求最终没有放行时使用）"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.capacity, bucket[0] + 1)
+
+    def _evict_idle(self, now: float):
+        # 最久未访问的桶在最前面，遇到第一个未过期的即可停止
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedTokenBucketLimiter:
+    """
+    多进程共享的令牌桶：状态保存在共享内存数组中，键按 crc32 映射到固定数量的槽位。
+    内存大小固定，不需要淘汰；空闲槽位在下次访问时会被自然补满。
+    哈希冲突的键共用同一个桶（只会更严格，不会放宽限流），活跃键数接近槽位数时应调大
+    security.rate_limit.shared_slots。
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float], state):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else rate_per_minute)
+        # 每个槽位两个 double：[tokens, last_update]，last_update 为 0 表示未使用
+        self._state = state
+        self._slots = len(state) // 2
+
+    @staticmethod
+    def create_state(slots: int = DEFAULT_SHARED_SLOTS):
+        """在主进程中创建共享状态，随后传给各个 worker"""
+        return multiprocessing.Array('d', slots * 2)
+
+    def _index(self, key: str) -> int:
+        # 不能用 hash()：各进程的字符串哈希种子不同
+        return (zlib.crc32(key.encode('utf-8')) % self._slots) * 2
+
+    def acquire(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.monotonic() if now is None else now
+        index = self._index(key)
+        with self._state.get_lock():
+            tokens, last = self._state[index], self._state[index + 1]
+            if last == 0:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._state[index] = tokens
+            self._state[index + 1] = now
+        if allowed:
+            return True, 0.0
+        if self.rate <= 0:
+            return False, float('inf')
+        return False, (1 - tokens) / self.rate
+
+    def refund(self, key: str):
+        index = self._index(key)
+        with self._state.get_lock():
+            self._state[index] = min(self.capacity, self._state[index] + 1)
+
+
+class RateLimiter:
+    """同时按客户端IP和目标主机限流"""
+
+    def __init__(self, client_limiter: Optional[TokenBucketLimiter], host_limiter: Optional[TokenBucketLimiter]):
+        self.client_limiter = client_limiter
+        self.host_limiter = host_limiter
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, rate_limit_config: dict, shared_state: Optional[dict] = None) -> Optional['RateLimiter']:
+        """
+        根据 config.json 的 security.rate_limit 段创建限流器，未启用时返回 None。
+        速率小于等于 0 视为不限制对应维度；两个维度都不限制时同样返回 None。
+        多进程模式下传入 create_shared_state 的结果，各 worker 共用同一组计数。
+        """
+        if not rate_limit_config.get('enabled', False):
+            return None
+        requests_per_minute = rate_limit_config.get('requests_per_minute', 100) or 0
+        host_requests_per_minute = rate_limit_config.get('host_requests_per_minute') or 0
+
+        client_limiter = None
+        if requests_per_minute > 0:
+            if shared_state is not None:
+                client_limiter = SharedTokenBucketLimiter(
+                    requests_per_minute, rate_limit_config.get('burst'), shared_state['client']
+                )
+            else:
+                client_limiter = TokenBucketLimiter(
+                    requests_per_minute, rate_limit_config.get('burst')
+                )
+        host_limiter = None
+        if host_requests_per_minute > 0:
+            if shared_state is not None:
+                host_limiter = SharedTokenBucketLimiter(
+                    host_requests_per_minute, rate_limit_config.get('host_burst'), shared_state['host']
+                )
+            else:
+                host_limiter = TokenBucketLimiter(
+                    host_requests_per_minute, rate_limit_config.get('host_burst')
+                )
+        if client_limiter is None and host_limiter is None:
+            return None
+        return cls(client_limiter, host_limiter)
+
+    @staticmethod
+    def create_shared_state(rate_limit_config: dict) -> Optional[dict]:
+        """为多进程模式创建共享计数，未启用限流时返回 None；未启用的维度不分配共享内存"""
+        if not rate_limit_config.get('enabled', False):
+            return None
+        slots = max(1, int(rate_limit_config.get('shared_slots', DEFAULT_SHARED_SLOTS)))
+        state = {}
+        if (rate_limit_config.get('requests_per_minute', 100) or 0) > 0:
+            state['client'] = SharedTokenBucketLimiter.create_state(slots)
+        if (rate_limit_config.get('host_requests_per_minute') or 0) > 0:
+            state['host'] = SharedTokenBucketLimiter.create_state(slots)
+        return state
+
+    def check(self, client_ip: str, target_host: Optional[str]) -> Tuple[bool, int]:
+        """检查请求是否放行，返回 (是否允许, Retry-After 秒数)"""
+        allowed, wait = True, 0.0
+        if self.client_limiter is not None:
+            allowed, wait = self.client_limiter.acquire(client_ip)
+        if allowed and self.host_limiter is not None and target_host:
+            allowed, wait = self.host_limiter.acquire(target_host)
+            if not allowed and self.client_limiter is not None:
+                # 目标主机超限时把客户端的令牌还回去
+                self.client_limiter.refund(client_ip)
+        if allowed:
+            return True, 0
+        self.rejected += 1
+        return False, max(1, math.ceil(min(wait, MAX_RETRY_AFTER)))
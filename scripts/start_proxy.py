@@ -8,7 +8,12 @@ import asyncio
 import json
 import argparse
 import logging
-from ..cors_proxy_server import CORSProxyServer
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from cors_proxy_server import CORSProxyServer, configure_logging
 
 def load_config(config_file='config.json'):
     """加载配置文件"""
@@ -28,16 +33,9 @@ def load_config(config_file='config.json'):
         print(f"配置文件格式错误: {e}")
         return None
 
-def setup_logging(config):
-    """设置日志配置"""
-    log_config = config.get('logging', {})
-    level = getattr(logging, log_config.get('level', 'INFO').upper())
-    
-    logging.basicConfig(
-        level=level,
-        format=log_config.get('format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'),
-        filename=log_config.get('file')
-    )
+def setup_logging(config, debug=False):
+    """设置日志配置（与 cors_proxy_server.py 相同，但设置了 logging.file 时只写文件），logging.async 开启时返回后台写入线程（退出前需要 stop()）"""
+    return configure_logging(config, debug, console=False)
 
 async def run_server():
     """运行服务器"""
@@ -61,10 +59,10 @@ async def run_server():
     debug = args.debug or server_config.get('debug', False)
     
     # 设置日志
-    setup_logging(config)
+    log_writer = setup_logging(config, debug)
     
     # 创建并启动服务器
-    server = CORSProxyServer(host=host, port=port)
+    server = CORSProxyServer(host=host, port=port, config=config, config_path=args.config)
     
     print("=" * 50)
     print("CORS 代理服务器")
@@ -83,6 +81,9 @@ async def run_server():
     except Exception as e:
         print(f"服务器启动失败: {e}")
         logging.error(f"服务器启动失败: {e}")
+    finally:
+        if log_writer is not None:
+            log_writer.stop()
 
 if __name__ == '__main__':
     try:
@@ -1,66 +1,265 @@
 #!/usr/bin/env python3
 """
 启动脚本 - 同时启动CORS代理服务器和JWTOauth服务器
+默认以两个子进程启动并由 supervisor 监控、自动重启；
+--single-process 时在同一个事件循环中运行两个服务
 """
 
+import argparse
 import asyncio
+import importlib.util
 import subprocess
 import sys
 import os
+import time
+import urllib.error
+import urllib.request
 
-async def start_cors_proxy():
-    """启动CORS代理服务器"""
-    print("🚀 启动CORS代理服务器 (端口: 8080)...")
-    cors_process = subprocess.Popen([
-        sys.executable, "cors_proxy_server.py",
-        "--host", "127.0.0.1",
-        "--port", "8080"
-    ], cwd=os.getcwd())
-    return cors_process
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+JWT_OAUTH_DIR = os.path.join(ROOT_DIR, "JWTOauth")
 
-async def start_jwt_oauth():
-    """启动JWTOauth服务器"""
-    print("🔐 启动JWTOauth服务器 (端口: 8081)...")
-    jwt_process = subprocess.Popen([
-        sys.executable, "JWTOauth/main.py"
-    ], cwd=os.getcwd())
-    return jwt_process
+class ManagedChild:
+    """受 supervisor 管理的子进程，可选地保持一个已完成加载的热备进程"""
+    
+    # 启动后多久开始做健康检查（秒）
+    STARTUP_GRACE = 10
+    # 连续多少次健康检查失败后重启
+    MAX_PROBE_FAILURES = 3
+    # 运行超过该时间（秒）后认为已稳定，重置退避时间
+    STABLE_UPTIME = 60
+    MAX_BACKOFF = 30
+    
+    def __init__(self, name: str, args: list, health_url: str, use_standby: bool):
+        self.name = name
+        self.args = args
+        self.health_url = health_url
+        self.use_standby = use_standby
+        self.process = None
+        self.standby = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.probe_failures = 0
+        self.backoff = 0
+        self.restart_not_before = 0.0
+    
+    def _spawn(self, standby: bool = False) -> subprocess.Popen:
+        args = [sys.executable] + self.args + (["--standby"] if standby else [])
+        return subprocess.Popen(args, cwd=ROOT_DIR, stdin=subprocess.PIPE if standby else None)
+    
+    def start(self):
+        self.process = self._spawn()
+        self.started_at = time.monotonic()
+        self.probe_failures = 0
+        if self.use_standby and (self.standby is None or self.standby.poll() is not None):
+            self.standby = self._spawn(standby=True)
+    
+    def _promote_standby(self) -> bool:
+        """让热备进程开始监听端口，成功时返回 True"""
+        if self.standby is None or self.standby.poll() is not None:
+            return False
+        try:
+            self.standby.stdin.write(b"start\n")
+            self.standby.stdin.close()
+        except OSError:
+            return False
+        self.process = self.standby
+        self.standby = None
+        self.started_at = time.monotonic()
+        self.probe_failures = 0
+        if self.use_standby:
+            self.standby = self._spawn(standby=True)
+        return True
+    
+    def restart(self, reason: str):
+        uptime = self.uptime()
+        stop_process(self.process)
+        self.restarts += 1
+        # 运行稳定后再失败从头计算退避，频繁崩溃时退避时间翻倍
+        if uptime >= self.STABLE_UPTIME:
+            self.backoff = 0
+        self.backoff = min(self.MAX_BACKOFF, max(1, self.backoff * 2))
+        self.restart_not_before = time.monotonic() + self.backoff
+        
+        if self._promote_standby():
+            print(f"♻️  {self.name} {reason}，已切换到热备进程 (第 {self.restarts} 次重启)")
+        else:
+            print(f"♻️  {self.name} {reason}，重新启动 (第 {self.restarts} 次重启)")
+            self.start()
+    
+    def in_startup_grace(self) -> bool:
+        return time.monotonic() - self.started_at < self.STARTUP_GRACE
+    
+    def can_restart(self) -> bool:
+        return time.monotonic() >= self.restart_not_before
+    
+    def uptime(self) -> float:
+        return time.monotonic() - self.started_at if self.process else 0.0
+    
+    def stop(self):
+        stop_process(self.process)
+        stop_process(self.standby)
+
+def stop_process(process, timeout: float = 5):
+    """先 terminate，超时后 kill"""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def probe(url: str, timeout: float = 2) -> bool:
+    """HTTP 健康检查，返回码小于 500 即视为健康"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (urllib.error.URLError, OSError):
+        return False
+
+def format_uptime(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+def print_report(children):
+    print("📈 子进程状态:")
+    for child in children:
+        if child.process is None:
+            continue
+        print(f"   • {child.name}: pid={child.process.pid} 运行时间={format_uptime(child.uptime())} 重启次数={child.restarts}")
+
+async def supervise(children, probe_interval: float, report_interval: float):
+    """监控子进程：进程退出或健康检查连续失败时按退避时间重启"""
+    loop = asyncio.get_running_loop()
+    last_report = time.monotonic()
+    while True:
+        await asyncio.sleep(probe_interval)
+        for child in children:
+            exit_code = child.process.poll()
+            if exit_code is not None:
+                reason = f"已退出 (退出码 {exit_code})"
+            elif child.in_startup_grace():
+                continue
+            elif await loop.run_in_executor(None, probe, child.health_url):
+                child.probe_failures = 0
+                continue
+            else:
+                child.probe_failures += 1
+                if child.probe_failures < child.MAX_PROBE_FAILURES:
+                    continue
+                reason = f"连续 {child.probe_failures} 次健康检查失败"
+            
+            if child.can_restart():
+                child.restart(reason)
+        
+        if report_interval and time.monotonic() - last_report >= report_interval:
+            last_report = time.monotonic()
+            print_report(children)
+
+def load_jwt_oauth_module():
+    """以模块方式加载 JWTOauth/main.py（不执行其 __main__ 部分）"""
+    sys.path.insert(0, JWT_OAUTH_DIR)
+    spec = importlib.util.spec_from_file_location("jwt_oauth_main", os.path.join(JWT_OAUTH_DIR, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def run_single_process(workers: int):
+    """在同一进程、同一事件循环中运行CORS代理和JWT token服务"""
+    from aiohttp import web
+    sys.path.insert(0, ROOT_DIR)
+    from cors_proxy_server import CORSProxyServer, load_config, DEFAULT_CONFIG_PATH
+    
+    print("🚀 单进程模式: CORS代理 (端口: 8080) + JWTOauth (端口: 8081)...")
+    proxy = CORSProxyServer(
+        host="127.0.0.1", port=8080,
+        config=load_config(DEFAULT_CONFIG_PATH), config_path=DEFAULT_CONFIG_PATH
+    )
+    jwt_oauth = load_jwt_oauth_module()
+    jwt_runner = web.AppRunner(jwt_oauth.create_async_app(workers), access_log=None)
+    
+    await proxy.startup()
+    await jwt_runner.setup()
+    await web.TCPSite(jwt_runner, "127.0.0.1", 8081).start()
+    try:
+        print_status()
+        await asyncio.Future()
+    finally:
+        await jwt_runner.cleanup()
+        await proxy.shutdown()
+
+def print_status():
+    print("\n✅ 服务器启动完成!")
+    print("📊 服务状态:")
+    print(f"   • CORS代理服务器: http://127.0.0.1:8080")
+    print(f"   • JWT OAuth服务器: http://127.0.0.1:8081")
+    print(f"   • JWT回调地址: http://127.0.0.1:8081/callback")
+    print("\n🛑 按 Ctrl+C 停止所有服务器")
 
 async def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="Coze JWT认证系统启动器")
+    parser.add_argument(
+        "--single-process", action="store_true",
+        help="在一个进程的同一事件循环中运行CORS代理和JWT token服务"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 4,
+        help="单进程模式下同时获取token的线程数"
+    )
+    parser.add_argument(
+        "--standby", action="store_true",
+        help="为每个子进程预先启动一个已完成加载的热备进程，故障时立即切换"
+    )
+    parser.add_argument("--probe-interval", type=float, default=5, help="健康检查间隔（秒）")
+    parser.add_argument("--report-interval", type=float, default=300, help="打印子进程状态的间隔（秒），0 为不打印")
+    args = parser.parse_args()
+    
     print("=" * 50)
     print("🌟 Coze JWT认证系统启动器")
     print("=" * 50)
     
+    if args.single_process:
+        await run_single_process(args.workers)
+        return
+    
+    children = [
+        ManagedChild(
+            "CORS代理服务器",
+            ["cors_proxy_server.py", "--host", "127.0.0.1", "--port", "8080"],
+            "http://127.0.0.1:8080/__health", args.standby
+        ),
+        ManagedChild(
+            "JWTOauth服务器",
+            ["JWTOauth/main.py"],
+            "http://127.0.0.1:8081/__health", args.standby
+        ),
+    ]
     try:
         # 启动两个服务器
-        cors_process = await start_cors_proxy()
-        jwt_process = await start_jwt_oauth()
+        print("🚀 启动CORS代理服务器 (端口: 8080)...")
+        children[0].start()
+        print("🔐 启动JWTOauth服务器 (端口: 8081)...")
+        children[1].start()
         
-        print("\n✅ 服务器启动完成!")
-        print("📊 服务状态:")
-        print(f"   • CORS代理服务器: http://127.0.0.1:8080")
-        print(f"   • JWT OAuth服务器: http://127.0.0.1:8081")
-        print(f"   • JWT回调地址: http://127.0.0.1:8081/callback")
-        print("\n🛑 按 Ctrl+C 停止所有服务器")
+        print_status()
         
-        # 等待用户中断
-        await asyncio.Future()
+        # 监控子进程直到用户中断
+        await supervise(children, args.probe_interval, args.report_interval)
         
-    except KeyboardInterrupt:
-        print("\n🛑 正在停止服务器...")
-        cors_process.terminate()
-        jwt_process.terminate()
-        cors_process.wait()
-        jwt_process.wait()
-        print("✅ 所有服务器已停止")
     except Exception as e:
         print(f"❌ 启动失败: {e}")
-        if 'cors_process' in locals():
-            cors_process.terminate()
-        if 'jwt_process' in locals():
-            jwt_process.terminate()
         sys.exit(1)
+    finally:
+        print("\n🛑 正在停止服务器...")
+        for child in children:
+            child.stop()
+        print_report(children)
+        print("✅ 所有服务器已停止")
 
 if __name__ == "__main__":
     try: